@@ -1,28 +1,133 @@
 import polars as pl
 
-# Charger les fichiers combinés, pilotes, et standings
-df_combined = pl.read_csv('C:/Users/mazgo/Downloads/singapore_combined_data_all_years.csv')
-df_drivers = pl.read_csv('C:/Users/mazgo/Downloads/csv/drivers.csv')
-df_driver_standings = pl.read_csv('C:/Users/mazgo/Downloads/csv/driver_standings.csv')
+# État par pilote après sa dernière course connue (persisté pour le mode incrémental) :
+# points / victoires cumulés dans la saison (comme dans driver_standings) et totaux de carrière
+STATE_SCHEMA = {
+    'driverId': pl.Int32,
+    'date': pl.Date,
+    'year': pl.Int32,
+    'season_points': pl.Float64,
+    'season_wins': pl.Int64,
+    'total_wins': pl.Int64,
+    'total_points': pl.Float64,
+    'total_podiums': pl.Int64,
+    'sum_position': pl.Int64,
+    'n_position': pl.Int64,
+}
 
-# Calculer le nombre total de victoires pour chaque pilote
-df_victories = df_driver_standings.group_by('driverId').agg(
-    pl.col('wins').sum().alias('total_wins')
-)
+# Statistiques ajoutées à chaque ligne (raceId, driverId), calculées avant la course
+HISTORY_FEATURES = ['total_wins', 'total_points', 'total_podiums', 'average_position']
 
-# Joindre les victoires avec les informations des pilotes dans les données combinées
-df_combined = df_combined.join(df_victories, on='driverId', how='left')
 
-# Ajouter d'autres statistiques comme podiums et positions moyennes
-df_podiums = df_driver_standings.group_by('driverId').agg(
-    pl.col('points').sum().alias('total_points'),
-    pl.col('position').mean().alias('average_position')
-)
+# Historique cumulé des pilotes : une ligne par (pilote, course) avec les totaux de carrière
+# APRÈS cette course. Les points et victoires de driver_standings sont cumulés par saison :
+# on reprend l'apport de chaque course par différence avec la course précédente de la saison,
+# puis on cumule sur toute la carrière. Un seul passage vectorisé, trié par (pilote, date).
+# df_state (optionnel) contient le dernier état connu de chaque pilote : les nouvelles lignes
+# prolongent alors l'historique existant au lieu de le recalculer.
+def driver_history(df_driver_standings, df_races, df_results, df_state=None):
+    df_rows = (
+        df_driver_standings.lazy()
+        .join(df_races.lazy().select('raceId', 'date', 'year'), on='raceId', how='inner')
+        .join(df_results.lazy().select('raceId', 'driverId', pl.col('position').alias('race_position')),
+              on=['raceId', 'driverId'], how='left')
+        .select(
+            'driverId', 'date', 'year',
+            pl.col('points').cast(pl.Float64),
+            pl.col('wins').cast(pl.Int64),
+            pl.col('position').cast(pl.Int64),
+            (pl.col('race_position') <= 3).fill_null(False).cast(pl.Int64).alias('podium'),
+            pl.lit(False).alias('is_state'),
+            pl.lit(None, pl.Int64).alias('total_wins'),
+            pl.lit(None, pl.Float64).alias('total_points'),
+            pl.lit(None, pl.Int64).alias('n_position'),
+        )
+    )
 
-df_combined = df_combined.join(df_podiums, on='driverId', how='left')
+    frames = [df_rows]
+    if df_state is not None:
+        # Les lignes d'état servent de point de départ : leurs totaux sont repris tels quels
+        frames.insert(0, df_state.lazy().cast(STATE_SCHEMA).select(
+            'driverId', 'date', 'year',
+            pl.col('season_points').alias('points'),
+            pl.col('season_wins').alias('wins'),
+            pl.col('sum_position').alias('position'),
+            pl.col('total_podiums').alias('podium'),
+            pl.lit(True).alias('is_state'),
+            'total_wins', 'total_points', 'n_position',
+        ))
+    df = pl.concat(frames).sort('driverId', 'date')
 
-# Sauvegarder les données combinées avec l'historique des pilotes
-df_combined.write_csv('C:/Users/mazgo/Downloads/singapore_combined_with_pilot_history.csv')
+    # Apport de chaque course (différence avec la course précédente de la même saison)
+    season = ['driverId', 'year']
+    race_points = pl.col('points') - pl.col('points').shift(1).over(season).fill_null(0)
+    race_wins = pl.col('wins') - pl.col('wins').shift(1).over(season).fill_null(0)
+    is_state = pl.col('is_state')
 
-# Vérification des premières lignes
-print(df_combined.head())
+    return df.with_columns(
+        pl.when(is_state).then(pl.col('total_points')).otherwise(race_points).alias('race_points'),
+        pl.when(is_state).then(pl.col('total_wins')).otherwise(race_wins).alias('race_wins'),
+        pl.when(is_state).then(pl.col('n_position'))
+        .otherwise(pl.col('position').is_not_null().cast(pl.Int64)).alias('race_n_position'),
+    ).select(
+        'driverId', 'date', 'year',
+        pl.col('points').alias('season_points'),
+        pl.col('wins').alias('season_wins'),
+        pl.col('race_wins').cum_sum().over('driverId').alias('total_wins'),
+        pl.col('race_points').cum_sum().over('driverId').alias('total_points'),
+        pl.col('podium').cum_sum().over('driverId').alias('total_podiums'),
+        pl.col('position').fill_null(0).cum_sum().over('driverId').alias('sum_position'),
+        pl.col('race_n_position').cum_sum().over('driverId').alias('n_position'),
+    ).cast(STATE_SCHEMA)
+
+
+# Dernier état connu de chaque pilote (à persister pour la prochaine mise à jour)
+def driver_state(df_history):
+    return df_history.lazy().sort('driverId', 'date').group_by('driverId').last().cast(STATE_SCHEMA)
+
+
+# Profil actuel de chaque pilote (statistiques après sa dernière course), précalculé pour
+# les prédictions : une ligne par pilote, prête à être lue sans filtrer driver_standings
+def driver_profiles(df_state, df_drivers):
+    return df_state.lazy().select(
+        'driverId',
+        'total_wins',
+        'total_points',
+        'total_podiums',
+        (pl.col('sum_position') / pl.col('n_position')).alias('average_position'),
+    ).join(df_drivers.lazy().select('driverId', 'surname'), on='driverId', how='left')
+
+
+# Joindre à chaque ligne (raceId, driverId) l'historique du pilote tel qu'il était
+# AVANT la course (jointure as-of stricte sur la date) : aucune fuite de données futures
+def join_driver_history(df_combined, df_history):
+    df_history = df_history.lazy().select(
+        'driverId',
+        pl.col('date').alias('history_date'),
+        'total_wins',
+        'total_points',
+        'total_podiums',
+        (pl.col('sum_position') / pl.col('n_position')).alias('average_position'),
+    ).sort('history_date')
+
+    return (
+        # Les deux côtés sont triés sur la date juste avant la jointure
+        df_combined.lazy()
+        .sort('date')
+        .join_asof(df_history, left_on='date', right_on='history_date', by='driverId',
+                   strategy='backward', allow_exact_matches=False, check_sortedness=False)
+        .drop('history_date')
+        # Première course du pilote : aucun historique
+        .with_columns(pl.col('total_wins', 'total_points', 'total_podiums').fill_null(0))
+    )
+
+
+# Ajouter l'historique des pilotes (victoires, points, podiums, position moyenne) aux données combinées
+def add_pilot_history(df_combined, df_driver_standings, df_races, df_results):
+    return join_driver_history(df_combined, driver_history(df_driver_standings, df_races, df_results))
+
+
+if __name__ == '__main__':
+    # Exécuter le pipeline jusqu'à cette étape et sauvegarder les données avec l'historique
+    from feature_pipeline import main
+    main(until='pilot_history')
@@ -1,35 +1,154 @@
+import io
+import json
+import time
 import streamlit as st
 import pandas as pd
-import zipfile
 import matplotlib.pyplot as plt
 import seaborn as sns
-from weather_parsing import filter_weather_by_circuit  # 🌦️ Importer la fonction de filtrage météo
+from data_store import load_table_pandas, tables_version  # 🗄️ Tables Ergast typées (Arrow IPC)
+from memory_cache import ByteBudgetLRU  # 🧠 Cache LRU partagé (budget en octets)
+from weather_parsing import filter_weather_by_circuit, get_weather_summary, export_weather_zip, shared_weather_cache  # 🌦️ Importer les fonctions météo
+from prediction_server import remote_predictor_from_env  # 🤖 Client du serveur de prédiction (optionnel)
+from dashboard_index import DashboardIndex  # 🗂️ Index des recherches du dashboard
+from feature_pipeline import DEFAULT_MODEL_PATH  # 🤖 Modèle entraîné (train_prediction_model.py)
+from instrumentation import span, span_rows, traced, tracer  # ⏱️ Temps et mémoire de chaque étape
+
+# ⏱️ Début de cette exécution du script : le panneau de debug affiche les spans ouverts depuis
+rerun_mark = tracer.mark()
+rerun_start = time.perf_counter()
 
 # 🎨 Configuration de l'esthétique de Seaborn
 sns.set_style("darkgrid")
 
-# 📦 Utiliser la mise en cache pour les fichiers volumineux
-@st.cache_data
+# 📦 Tables statiques chargées une seule fois par processus et partagées par toutes les sessions
+# (tables typées lues depuis le magasin Arrow, voir data_store.py) : lecture seule, ne pas modifier
+@st.cache_resource
+@traced('app.load_circuits')
 def load_circuits():
-    return pd.read_csv('circuits.csv')
+    return load_table_pandas('circuits')
 
-@st.cache_data
+@st.cache_resource
+@traced('app.load_drivers')
 def load_drivers():
-    return pd.read_csv('drivers.csv')
+    return load_table_pandas('drivers')
 
-@st.cache_data
+@st.cache_resource
+@traced('app.load_results')
 def load_results():
-    return pd.read_csv('results.csv')
+    return load_table_pandas('results')
 
-@st.cache_data
+@st.cache_resource
+@traced('app.load_races')
 def load_races():
-    return pd.read_csv('races.csv')
+    return load_table_pandas('races')
 
 # 📂 Charger les fichiers CSV une seule fois grâce à la mise en cache
-circuits_df = load_circuits()
-drivers_df = load_drivers()
-results_df = load_results()
-races_df = load_races()
+with span('app.load_tables', cached=True):
+    circuits_df = load_circuits()
+    drivers_df = load_drivers()
+    results_df = load_results()
+    races_df = load_races()
+
+# 🗂️ Index construit une seule fois par processus (recherches par nom, tranches de résultats, classements)
+@st.cache_resource
+@traced('app.build_index')
+def load_dashboard_index():
+    return DashboardIndex(circuits_df, drivers_df, results_df, races_df)
+
+with span('app.dashboard_index', cached=True):
+    dashboard_index = load_dashboard_index()
+
+# 👤 Profils des pilotes chargés une seule fois par processus (prédiction distante et simulation) :
+# sans driver_profiles.parquet, ils sont recalculés à partir des tables, à ne pas refaire à chaque rerun
+@st.cache_resource
+@traced('app.load_profiles')
+def load_profiles():
+    from predict_pilot_performance import load_driver_profiles
+    return load_driver_profiles()
+
+# 🤖 Modèle et profils des pilotes chargés une seule fois par processus (si le modèle a été entraîné)
+@st.cache_resource
+@traced('app.load_model')
+def load_simulation_inputs():
+    import os
+    from forest_export import forest_is_fresh
+    if not os.path.exists(DEFAULT_MODEL_PATH) and not forest_is_fresh(DEFAULT_MODEL_PATH):
+        return None
+    from predict_pilot_performance import load_prediction_model
+    return load_prediction_model(), load_profiles()
+
+# 🌦️ Météo réelle de chaque course (agrégats par fenêtre de course, voir weather_streaming.py),
+# chargée une seule fois par processus ; None si les agrégats n'ont pas encore été calculés
+@st.cache_resource
+@traced('app.load_race_weather')
+def load_race_weather():
+    import os
+    from weather_streaming import DEFAULT_OUTPUT_PATH
+    if not os.path.exists(DEFAULT_OUTPUT_PATH):
+        return None
+    return pd.read_parquet(DEFAULT_OUTPUT_PATH, columns=['raceId', 'fact_temperature_mean', 'gfs_humidity_mean'])
+
+# 🖼️ Graphiques déjà rendus (PNG), partagés par toutes les sessions : un changement de curseur
+# ne reconstruit pas les figures tant que le circuit, le pilote et les données sont inchangés
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource
+def chart_cache():
+    return ByteBudgetLRU(CHART_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def data_version():
+    return tables_version(['circuits', 'drivers', 'results', 'races'])
+
+# 🖨️ Rendre une figure matplotlib en PNG puis la fermer
+def figure_png(fig):
+    buffer = io.BytesIO()
+    with span('app.savefig'):
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+# 📈 Historique des positions du pilote sur le circuit
+def render_position_history(driver_race_data):
+    fig, ax = plt.subplots()
+    sns.lineplot(data=driver_race_data, x='year', y='positionOrder', marker='o', ax=ax)
+    ax.set_xlabel('📅 Année')
+    ax.set_ylabel('🏁 Position Finale')
+    ax.set_xticks(driver_race_data['year'].unique())
+    ax.set_xticklabels(driver_race_data['year'].unique(), rotation=45, ha='right')
+    # 🎯 Ajuster les ticks de l'axe Y pour qu'ils incrémentent de 1 en 1
+    ax.set_yticks(range(1, int(driver_race_data['positionOrder'].max()) + 1, 1))
+    return figure_png(fig)
+
+# 🏅 Classement des pilotes sur le circuit (position moyenne)
+def render_leaderboard(top_pilots):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.barplot(data=top_pilots, x='positionOrder', y='surname', palette='coolwarm', ax=ax)
+    ax.set_xlabel('📊 Position Moyenne')
+    ax.set_ylabel('👤 Pilote')
+    return figure_png(fig)
+
+# 🌦️ Influence des conditions météo sur les positions historiques
+# (température et humidité moyennes observées autour de chaque course)
+def render_weather_scatter(driver_race_weather):
+    fig, ax = plt.subplots()
+    scatter = ax.scatter(driver_race_weather['fact_temperature_mean'], driver_race_weather['positionOrder'],
+                         c=driver_race_weather['gfs_humidity_mean'], cmap='viridis', s=100)
+    ax.set_xlabel('🌡️ Température moyenne (°C)')
+    ax.set_ylabel('🏁 Position Finale')
+    cbar = fig.colorbar(scatter, ax=ax)
+    cbar.set_label('💧 Humidité moyenne (%)')
+    # 🔄 Inverser l'axe Y pour que la position 1 soit en haut
+    ax.invert_yaxis()
+    return figure_png(fig)
+
+# 🗝️ Lire un graphique dans le cache ou le rendre, clé (graphique, circuit, pilote, version des données)
+def cached_chart(chart, circuit_id, driver_id, render):
+    with span('app.chart', cache='hit', chart=chart) as s:
+        def load():
+            s.set(cache='miss')
+            return render()
+        return chart_cache().get_or_load((chart, circuit_id, driver_id, data_version()), load)
 
 # 🏁 Titre du dashboard
 st.title("🏎️ Prédiction des résultats des courses de F1 en fonction de la météo 🌤️")
@@ -44,56 +163,43 @@ st.sidebar.header("👤 Sélectionner un pilote")
 available_drivers = drivers_df['surname'].unique()
 selected_driver = st.sidebar.selectbox('🏎️ Choisir un pilote', available_drivers)
 
-# 🌐 Filtrer les données météo uniquement lorsque le circuit ou le pilote change
-if 'selected_circuit' not in st.session_state or st.session_state.selected_circuit != selected_circuit or \
-   'selected_driver' not in st.session_state or st.session_state.selected_driver != selected_driver:
+# 🌐 La session ne garde que les clés sélectionnées : les données restent dans les caches partagés
+if st.session_state.get('selected_circuit') != selected_circuit or \
+   st.session_state.get('selected_driver') != selected_driver:
 
     st.session_state.selected_circuit = selected_circuit
     st.session_state.selected_driver = selected_driver
 
     with st.spinner(f"🔍 Récupération des données météo pour {selected_circuit}..."):
-        compressed_weather_file = filter_weather_by_circuit(selected_circuit, margin=50)
-
-    if compressed_weather_file:
-        # 📂 Ouvrir le fichier ZIP en mémoire
-        with zipfile.ZipFile(compressed_weather_file) as zip_ref:
-            # 📄 Obtenir la liste des fichiers dans le ZIP
-            zip_contents = zip_ref.namelist()
-            # 📑 Supposons qu'il n'y a qu'un seul fichier CSV dans le ZIP
-            csv_filename = zip_contents[0]
-            # 📖 Ouvrir le fichier CSV à l'intérieur du ZIP
-            with zip_ref.open(csv_filename) as csv_file:
-                # 📊 Lire le CSV dans un DataFrame Pandas
-                weather_df = pd.read_csv(csv_file)
-        st.session_state.weather_df = weather_df
-    else:
-        st.session_state.weather_df = None
+        # 📊 Seules les statistiques précalculées (min / max / moyenne) sont nécessaires ici
+        with span('app.weather_summary', cached=True, circuit=selected_circuit):
+            get_weather_summary(selected_circuit)
 
-# 🌡️ Récupérer les données météo depuis la session
-weather_df = st.session_state.get('weather_df', None)
+# 🌡️ Statistiques météo lues dans le cache partagé (aucune copie par session)
+with span('app.weather_summary', cached=True, circuit=st.session_state.selected_circuit):
+    weather_stats = get_weather_summary(st.session_state.selected_circuit)
 
 # ✅ Si les données météo existent, continuer l'analyse
-if weather_df is not None:
+if weather_stats is not None:
+    # 📦 Export ZIP explicite : la partition complète n'est lue qu'à la demande
+    st.sidebar.header("📦 Export météo")
+    if st.sidebar.button("Préparer l'export CSV (ZIP)"):
+        st.sidebar.download_button(
+            "⬇️ Télécharger les données météo",
+            data=export_weather_zip(filter_weather_by_circuit(selected_circuit), selected_circuit),
+            file_name=f"{selected_circuit}_weather.zip",
+            mime="application/zip",
+        )
+
     # 📍 Afficher les coordonnées du circuit sélectionné
-    circuit_data = circuits_df[circuits_df['name'] == selected_circuit]
-    latitude = circuit_data['lat'].values[0]
-    longitude = circuit_data['lng'].values[0]
+    selected_circuit_id, latitude, longitude = dashboard_index.circuit(selected_circuit)
     st.subheader(f"📌 Coordonnées du circuit {selected_circuit}")
     st.write(f"**📍 Latitude :** {latitude}, **📍 Longitude :** {longitude}")
 
-    # 🔢 Obtenir le circuitId du circuit sélectionné
-    selected_circuit_id = circuit_data['circuitId'].values[0]
-
-    # 🏎️ Filtrer les courses dans races.csv pour le circuit sélectionné
-    selected_races = races_df[races_df['circuitId'] == selected_circuit_id]
-    selected_race_ids = selected_races['raceId'].tolist()
-
-    # 📊 Utiliser uniquement les colonnes nécessaires
-    filtered_results_df = results_df[results_df['raceId'].isin(selected_race_ids)][['raceId', 'driverId', 'positionOrder', 'points', 'laps', 'milliseconds']]
-
-    # 👤 Filtrer les données pour le pilote sélectionné sur le circuit sélectionné
-    driver_id = drivers_df[drivers_df['surname'] == selected_driver]['driverId'].values[0]
-    driver_data = filtered_results_df[filtered_results_df['driverId'] == driver_id]
+    # 👤 Résultats du pilote sélectionné sur le circuit sélectionné (tranche précalculée, triée par année)
+    with span('app.driver_results'):
+        driver_id = dashboard_index.driver_id(selected_driver)
+        driver_data = dashboard_index.driver_results(selected_circuit_id, driver_id)
 
     if driver_data.empty:
         st.write(f"❌ Pas de données pour {selected_driver} sur le circuit {selected_circuit}.")
@@ -105,30 +211,31 @@ if weather_df is not None:
         st.sidebar.header("⚙️ Paramètres Météo")
 
         temperature = st.sidebar.slider('🌡️ Température (°C)',
-                                        min_value=int(weather_df['fact_temperature'].min()),
-                                        max_value=int(weather_df['fact_temperature'].max()),
-                                        value=int(weather_df['fact_temperature'].mean()))
+                                        min_value=int(weather_stats['fact_temperature']['min']),
+                                        max_value=int(weather_stats['fact_temperature']['max']),
+                                        value=int(weather_stats['fact_temperature']['mean']))
 
         pressure = st.sidebar.slider('📉 Pression Atmosphérique (hPa)',
-                                     min_value=int(weather_df['gfs_pressure'].min()),
-                                     max_value=int(weather_df['gfs_pressure'].max()),
-                                     value=int(weather_df['gfs_pressure'].mean()))
+                                     min_value=int(weather_stats['gfs_pressure']['min']),
+                                     max_value=int(weather_stats['gfs_pressure']['max']),
+                                     value=int(weather_stats['gfs_pressure']['mean']))
 
         humidity = st.sidebar.slider('💧 Humidité (%)',
-                                     min_value=int(weather_df['gfs_humidity'].min()),
-                                     max_value=int(weather_df['gfs_humidity'].max()),
-                                     value=int(weather_df['gfs_humidity'].mean()))
+                                     min_value=int(weather_stats['gfs_humidity']['min']),
+                                     max_value=int(weather_stats['gfs_humidity']['max']),
+                                     value=int(weather_stats['gfs_humidity']['mean']))
 
         wind_speed = st.sidebar.slider('💨 Vitesse du Vent (km/h)',
-                                       min_value=int(weather_df['gfs_wind_speed'].min()),
-                                       max_value=int(weather_df['gfs_wind_speed'].max()),
-                                       value=int(weather_df['gfs_wind_speed'].mean()))
+                                       min_value=int(weather_stats['gfs_wind_speed']['min']),
+                                       max_value=int(weather_stats['gfs_wind_speed']['max']),
+                                       value=int(weather_stats['gfs_wind_speed']['mean']))
 
-        # 📐 Calcul des facteurs d'influence météo
-        temperature_factor = (temperature - weather_df['fact_temperature'].mean()) * 0.05
-        pressure_factor = (pressure - weather_df['gfs_pressure'].mean()) * 0.01
-        humidity_factor = (humidity - weather_df['gfs_humidity'].mean()) * 0.02
-        wind_factor = (wind_speed - weather_df['gfs_wind_speed'].mean()) * 0.03
+        # 📐 Ajustement heuristique (coefficients fixes, non appris) de la position moyenne selon l'écart
+        # aux conditions moyennes du circuit ; les prédictions du modèle et la simulation sont plus bas
+        temperature_factor = (temperature - weather_stats['fact_temperature']['mean']) * 0.05
+        pressure_factor = (pressure - weather_stats['gfs_pressure']['mean']) * 0.01
+        humidity_factor = (humidity - weather_stats['gfs_humidity']['mean']) * 0.02
+        wind_factor = (wind_speed - weather_stats['gfs_wind_speed']['mean']) * 0.03
 
         # ➕ Ajuster la position prédite en fonction des conditions météo
         predicted_position_adjusted = predicted_position + temperature_factor + pressure_factor + humidity_factor + wind_factor
@@ -167,61 +274,104 @@ if weather_df is not None:
             unsafe_allow_html=True
         )
 
+        # 🤖 Prédiction du modèle entraîné, si un serveur de prédiction est configuré (F1_PREDICTION_SERVER)
+        remote_model = remote_predictor_from_env()
+        if remote_model is not None:
+            from predict_pilot_performance import predict_scenarios
+            starting_position = st.sidebar.slider('🚦 Position de départ', min_value=1, max_value=20, value=10)
+            with span('app.profiles', cached=True):
+                profiles = load_profiles()
+            try:
+                with span('app.remote_prediction'):
+                    model_prediction = predict_scenarios(
+                        remote_model, [selected_driver], [starting_position],
+                        [{'climate_temperature': temperature, 'gfs_wind_speed': wind_speed, 'gfs_humidity': humidity}],
+                        profiles=profiles,
+                    )
+                st.metric(f"🤖 Position prédite par le modèle (départ P{starting_position})",
+                          f"{model_prediction['predicted_position'].iloc[0]:.1f}")
+            except (OSError, KeyError) as e:
+                st.warning(f"⚠️ Serveur de prédiction indisponible : {e}")
+
+        # 🎲 Simulation Monte Carlo de toute la course (dernière grille connue sur ce circuit)
+        with span('app.simulation_inputs', cached=True):
+            simulation_inputs = load_simulation_inputs()
+        grid_driver_ids, grid_positions = dashboard_index.last_grid(selected_circuit_id)
+        if simulation_inputs is not None and grid_driver_ids:
+            from race_simulation import simulate_race
+            model, profiles = simulation_inputs
+            st.subheader(f"🎲 Simulation de la course sur {selected_circuit}")
+            try:
+                with span('app.simulation', n_sims=20_000):
+                    simulation = simulate_race(
+                        model, grid_driver_ids, grid_positions,
+                        {'climate_temperature': temperature, 'gfs_wind_speed': wind_speed, 'gfs_humidity': humidity},
+                        n_sims=20_000, profiles=profiles,
+                    )
+                st.dataframe(simulation.style.format({
+                    'win_prob': '{:.1%}', 'podium_prob': '{:.1%}', 'points_prob': '{:.1%}',
+                    'expected_points': '{:.1f}', 'expected_position': '{:.1f}',
+                }), hide_index=True)
+            except KeyError as e:
+                st.warning(f"⚠️ Simulation impossible : {e}")
+
         # 📊 **Visualisations mises à jour :**
 
         # 1. 📈 Historique des positions du pilote sur le circuit (avec années non chevauchées et positions incrémentées de 1 en 1)
         st.subheader(f"📉 Historique des performances de {selected_driver} sur {selected_circuit}")
-        # 🔗 Joindre avec races_df pour obtenir l'année de chaque course
-        driver_race_data = driver_data.merge(races_df[['raceId', 'year']], on='raceId')
-        driver_race_data = driver_race_data.sort_values('year')
-        fig, ax = plt.subplots()
-        sns.lineplot(data=driver_race_data, x='year', y='positionOrder', marker='o', ax=ax)
-        ax.set_xlabel('📅 Année')
-        ax.set_ylabel('🏁 Position Finale')
-        ax.set_xticks(driver_race_data['year'].unique())
-        ax.set_xticklabels(driver_race_data['year'].unique(), rotation=45, ha='right')
-        # 🎯 Ajuster les ticks de l'axe Y pour qu'ils incrémentent de 1 en 1
-        ax.set_yticks(range(1, int(driver_race_data['positionOrder'].max()) + 1, 1))
-        st.pyplot(fig)
+        # 🔗 L'année de chaque course est déjà jointe dans l'index
+        st.image(cached_chart('position_history', selected_circuit_id, driver_id,
+                              lambda: render_position_history(driver_data)))
 
         # 2. 🏅 Classement des pilotes sur le circuit (position moyenne)
         st.subheader(f"🏅 Classement des pilotes sur {selected_circuit}")
-        # 📊 Calculer la position moyenne de chaque pilote sur le circuit
-        avg_positions = filtered_results_df.groupby('driverId')['positionOrder'].mean().reset_index()
-        avg_positions = avg_positions.merge(drivers_df[['driverId', 'surname']], on='driverId')
-        avg_positions = avg_positions.sort_values('positionOrder')
-        # 🔝 Afficher uniquement les 10 meilleurs pilotes
-        top_pilots = avg_positions.head(10)
-        fig, ax = plt.subplots(figsize=(10, 6))
-        sns.barplot(data=top_pilots, x='positionOrder', y='surname', palette='coolwarm', ax=ax)
-        ax.set_xlabel('📊 Position Moyenne')
-        ax.set_ylabel('👤 Pilote')
-        st.pyplot(fig)
+        # 🔝 Les 10 meilleurs pilotes (position moyenne), précalculés pour chaque circuit
+        st.image(cached_chart('leaderboard', selected_circuit_id, None,
+                              lambda: render_leaderboard(dashboard_index.leaderboard(selected_circuit_id))))
 
         # 3. 🌦️ Influence des conditions météo sur les positions historiques (nouveau graphique)
         st.subheader(f"🌤️ Conditions météo historiques sur {selected_circuit}")
-        # 🔗 Supposons que nous ayons des données météo historiques pour les courses
-        # Joindre les données météo historiques avec les résultats
-        # (Pour cet exemple, nous allons générer des données aléatoires)
-        import numpy as np
-        driver_race_data['Température'] = np.random.uniform(15, 35, size=len(driver_race_data))
-        driver_race_data['Humidité'] = np.random.uniform(30, 80, size=len(driver_race_data))
-
-        fig, ax = plt.subplots()
-        scatter = ax.scatter(driver_race_data['Température'], driver_race_data['positionOrder'],
-                             c=driver_race_data['Humidité'], cmap='viridis', s=100)
-        ax.set_xlabel('🌡️ Température (°C)')
-        ax.set_ylabel('🏁 Position Finale')
-        cbar = fig.colorbar(scatter, ax=ax)
-        cbar.set_label('💧 Humidité (%)')
-        # 🔄 Inverser l'axe Y pour que la position 1 soit en haut
-        ax.invert_yaxis()
-        st.pyplot(fig)
+        with span('app.race_weather', cached=True):
+            race_weather = load_race_weather()
+        driver_race_weather = (driver_data.merge(race_weather, on='raceId', how='inner')
+                               if race_weather is not None else driver_data.iloc[0:0])
+        if driver_race_weather.empty:
+            st.info("ℹ️ Pas de météo observée pour les courses de ce pilote sur ce circuit "
+                    "(agrégats à calculer avec weather_streaming.py).")
+        else:
+            st.image(cached_chart('weather_scatter', selected_circuit_id, driver_id,
+                                  lambda: render_weather_scatter(driver_race_weather)))
 
     # 🛑 Fin de l'analyse
 else:
     st.write(f"⚠️ Aucune donnée météo disponible pour le circuit {selected_circuit}.")
 
+# 🐞 Panneau de debug (optionnel) : temps et mémoire de chaque étape de cette exécution,
+# accès aux caches partagés (hit / miss) et export de la trace / des métriques
+st.sidebar.header("🐞 Debug")
+if st.sidebar.checkbox("⏱️ Afficher le détail des temps", value=False):
+    rerun_spans = tracer.spans_since(rerun_mark)
+    st.subheader("🐞 Détail de cette exécution")
+    st.write(f"**⏱️ Durée du script :** {(time.perf_counter() - rerun_start) * 1000:.1f} ms")
+    if rerun_spans:
+        # 🌳 Profondeur de chaque span (indentation des étapes imbriquées)
+        depths = {}
+        for s in rerun_spans:
+            depths[s.seq] = depths.get(s.parent, -1) + 1
+        spans_df = pd.DataFrame(span_rows(rerun_spans))
+        spans_df['name'] = ['· ' * depths[seq] + name for seq, name in zip(spans_df['seq'], spans_df['name'])]
+        columns = [c for c in ('name', 'duration_ms', 'rss_end_mb', 'rss_delta_mb', 'cache', 'circuit', 'chart')
+                   if c in spans_df.columns]
+        st.dataframe(spans_df[columns].style.format({
+            'duration_ms': '{:.1f}', 'rss_end_mb': '{:.0f}', 'rss_delta_mb': '{:+.1f}',
+        }, na_rep=''), hide_index=True)
+    st.write("**🧠 Caches partagés**")
+    st.json({'météo': shared_weather_cache().stats(), 'graphiques': chart_cache().stats()})
+    st.download_button("⬇️ Trace JSON (Perfetto / chrome://tracing)", json.dumps(tracer.trace(rerun_spans)),
+                       file_name="trace.json", mime="application/json")
+    st.download_button("⬇️ Métriques Prometheus", tracer.prometheus(),
+                       file_name="metrics.prom", mime="text/plain")
+
 # 🎨 Personnalisation du style
 st.markdown(
     """
@@ -0,0 +1,434 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+from data_store import TABLE_SCHEMAS, csv_path, read_csv_typed
+from weather_streaming import peak_rss_mb
+
+DEFAULT_OUTPUT_DIR = os.path.join('output', 'benchmarks')
+DEFAULT_BASELINE_PATH = os.path.join(DEFAULT_OUTPUT_DIR, 'baseline.json')
+
+# Tailles par défaut : multiples des tables actuelles (results, driver_standings, pit_stops...)
+DEFAULT_SCALES = (1, 10, 100, 1000)
+
+# Observations météo synthétiques par unité d'échelle
+WEATHER_ROWS_PER_SCALE = 100_000
+
+# Observations écrites par bloc dans le Parquet météo (mémoire bornée aux grandes échelles)
+WEATHER_CHUNK_ROWS = 1_000_000
+
+# Part des observations tirées autour des circuits pendant les week-ends de course
+# (le reste est réparti sur tout le globe et toute la période)
+WEATHER_NEAR_RACE_SHARE = 0.5
+
+# Tables dupliquées à chaque réplique (courses, pilotes et tout ce qui en dépend) ;
+# les autres (circuits, écuries, statuts, saisons) sont copiées telles quelles
+REPLICATED_TABLES = (
+    'races', 'drivers', 'results', 'driver_standings', 'pit_stops', 'qualifying', 'sprint_results',
+    'constructor_results', 'constructor_standings',
+)
+
+# Identifiants décalés à chaque réplique : une réplique est une copie complète de l'historique,
+# avec ses propres courses (mêmes dates, mêmes circuits) et ses propres pilotes
+REPLICATED_IDS = (
+    'raceId', 'driverId', 'resultId', 'driverStandingsId', 'qualifyId', 'constructorResultsId',
+    'constructorStandingsId',
+)
+
+# Étapes mesurées, dans l'ordre (chacune dépend des fichiers écrits par les précédentes)
+STAGES = ('ingest', 'weather_index', 'weather_filter', 'race_weather_join', 'history', 'features',
+          'training', 'prediction')
+
+# Écart relatif toléré par rapport à la référence avant de signaler une régression
+DEFAULT_TOLERANCE = 0.25
+
+# En dessous de ces valeurs, les écarts relèvent du bruit de mesure
+MIN_WALL_S = 0.05
+MIN_RSS_MB = 20
+
+
+# Pic mémoire du processus (Mo). Sous Linux, ru_maxrss est hérité du processus parent à travers
+# fork + exec : VmHWM (/proc/self/status) est propre au processus et donne le pic de l'étape seule
+def process_peak_rss_mb():
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def scale_dir(work_dir, scale):
+    return os.path.join(work_dir, f'scale_{scale}')
+
+
+# Décalage de chaque identifiant entre deux répliques : plus grande valeur dans les tables source
+def _id_offsets(tables):
+    offsets = {}
+    for df in tables.values():
+        for column in REPLICATED_IDS:
+            if column in df.columns and df.height:
+                offsets[column] = max(offsets.get(column, 0), int(df[column].max()) + 1)
+    return offsets
+
+
+def _replica(df, table, k, offsets):
+    if k == 0:
+        return df
+    columns = [(pl.col(column) + k * offsets[column]).cast(df.schema[column])
+               for column in REPLICATED_IDS if column in df.columns]
+    if table == 'drivers':
+        # Noms distincts par réplique : la recherche par nom reste sans ambiguïté
+        columns.append(pl.col('surname') + f' {k}')
+    return df.with_columns(columns)
+
+
+# Écrire un CSV Ergast (en-tête, '\N' pour null) réplique par réplique, sans tout garder en mémoire
+def _write_replicated_csv(df, table, path, scale, offsets):
+    with open(path, 'wb') as f:
+        for k in range(scale if table in REPLICATED_TABLES else 1):
+            _replica(df, table, k, offsets).write_csv(f, include_header=(k == 0), null_value='\\N',
+                                                      time_format='%H:%M:%S')
+
+
+# Observations météo synthétiques au format de weather_sample.parquet
+def _weather_chunk(rng, n_rows, starts, lats, lngs, time_range):
+    n_near = int(n_rows * WEATHER_NEAR_RACE_SHARE)
+    race = rng.integers(0, len(starts), n_near)
+    n_far = n_rows - n_near
+
+    fact_time = np.concatenate([starts[race] + rng.integers(-2 * 86_400, 2 * 86_400, n_near),
+                                rng.integers(time_range[0], time_range[1], n_far)])
+    lat = np.concatenate([np.clip(lats[race] + rng.normal(0, 3, n_near), -90, 90), rng.uniform(-60, 70, n_far)])
+    lng = np.concatenate([(lngs[race] + rng.normal(0, 3, n_near) + 180) % 360 - 180, rng.uniform(-180, 180, n_far)])
+    temperature = 30 - np.abs(lat) * 0.4 + rng.normal(0, 5, n_rows)
+    return pl.DataFrame({
+        'fact_time': fact_time.astype(np.int64),
+        'fact_latitude': lat,
+        'fact_longitude': lng,
+        'fact_temperature': temperature,
+        'climate_temperature': temperature + rng.normal(0, 2, n_rows),
+        'gfs_pressure': rng.normal(1013, 8, n_rows),
+        'gfs_humidity': rng.uniform(20, 100, n_rows),
+        'gfs_wind_speed': rng.gamma(2, 2.5, n_rows),
+    })
+
+
+def _write_weather(path, races, circuits, n_rows, seed):
+    rng = np.random.default_rng(seed)
+    located = races.join(circuits.select('circuitId', 'lat', 'lng'), on='circuitId').select(
+        (pl.col('date').cast(pl.Datetime('us')) + pl.duration(hours=12)).dt.epoch('s').alias('start'), 'lat', 'lng',
+    )
+    starts, lats, lngs = (located[column].to_numpy() for column in ('start', 'lat', 'lng'))
+    time_range = (int(starts.min()) - 86_400, int(starts.max()) + 86_400)
+
+    writer = None
+    try:
+        for offset in range(0, n_rows, WEATHER_CHUNK_ROWS):
+            table = _weather_chunk(rng, min(WEATHER_CHUNK_ROWS, n_rows - offset), starts, lats, lngs,
+                                   time_range).to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# Jeu de données synthétique au format Ergast, `scale` fois la taille des CSV source,
+# et archive météo Parquet de WEATHER_ROWS_PER_SCALE × scale observations
+def generate_dataset(source_dir, target_dir, scale, weather_rows=None, seed=0):
+    os.makedirs(target_dir, exist_ok=True)
+    tables = {table: read_csv_typed(table, source_dir) for table in TABLE_SCHEMAS
+              if os.path.exists(csv_path(table, source_dir))}
+    offsets = _id_offsets(tables)
+    for table, df in tables.items():
+        _write_replicated_csv(df, table, csv_path(table, target_dir), scale, offsets)
+
+    weather_path = os.path.join(target_dir, 'weather_sample.parquet')
+    _write_weather(weather_path, tables['races'], tables['circuits'],
+                   weather_rows or WEATHER_ROWS_PER_SCALE * scale, seed)
+    return {table: df.height * (scale if table in REPLICATED_TABLES else 1) for table, df in tables.items()}
+
+
+# Chemins d'un jeu de données : CSV et archive météo, magasin Arrow, sorties (features, modèle)
+def _paths(data_root):
+    output_root = os.path.join(data_root, 'output')
+    return {
+        'data_dir': os.path.join(data_root, 'data'),
+        'weather': os.path.join(data_root, 'weather_sample.parquet'),
+        # Cache météo par circuit jamais construit : chaque étape lit l'archive (cas le plus coûteux)
+        'cache_dir': os.path.join(data_root, 'weather_cache'),
+        'output_root': output_root,
+        'model': os.path.join(output_root, 'model.pkl'),
+    }
+
+
+# Étapes : chaque fonction fait ses imports puis renvoie la tâche à chronométrer
+# (le temps d'import des modules n'est pas compté)
+def _stage_ingest(data_root, paths, race_name):
+    from data_store import ingest_tables
+
+    def run():
+        return {'tables': len(ingest_tables(None, data_root, paths['data_dir'], force=True))}
+    return run
+
+
+def _stage_weather_index(data_root, paths, race_name):
+    from weather_index import build_weather_index
+
+    def run():
+        build_weather_index(paths['weather'])
+        return {'rows': pq.ParquetFile(paths['weather']).metadata.num_rows}
+    return run
+
+
+# filter_weather_by_circuit (version sans Streamlit de weather_data.py) pour chaque circuit
+def _stage_weather_filter(data_root, paths, race_name):
+    from data_store import load_table
+    from weather_data import filter_weather_by_circuit
+
+    def run():
+        names = load_table('circuits', data_root, paths['data_dir'])['name'].unique(maintain_order=True)
+        rows = 0
+        for name in names:
+            df = filter_weather_by_circuit(name, paths['weather'], cache_dir=paths['cache_dir'], data_root=data_root)
+            rows += 0 if df is None else df.height
+        return {'circuits': len(names), 'rows': rows}
+    return run
+
+
+def _stage_race_weather_join(data_root, paths, race_name):
+    from feature_pipeline import build_features
+
+    def run():
+        lf = build_features(data_root, paths['weather'], race_name, cache_dir=paths['cache_dir'], until='weather')
+        return {'rows': lf.collect().height}
+    return run
+
+
+def _stage_history(data_root, paths, race_name):
+    from add_pilot_history import driver_history
+    from data_store import scan_table
+
+    def run():
+        df = driver_history(*(scan_table(table, data_root, paths['data_dir'])
+                              for table in ('driver_standings', 'races', 'results'))).collect()
+        return {'rows': df.height}
+    return run
+
+
+def _stage_features(data_root, paths, race_name):
+    from feature_pipeline import run_all_circuits
+
+    def run():
+        df = run_all_circuits(data_root, paths['output_root'], paths['weather'], cache_dir=paths['cache_dir'],
+                              workers=1)
+        return {'rows': df.height}
+    return run
+
+
+def _stage_training(data_root, paths, race_name):
+    import joblib
+    # Importés par train_model à l'appel : chargés ici pour rester hors du chronométrage
+    import sklearn.ensemble
+    import sklearn.metrics
+    import sklearn.model_selection
+
+    from feature_pipeline import ALL_CIRCUITS_FILE
+    from forest_export import export_forest, forest_dir
+    from train_prediction_model import load_training_data, train_model
+
+    def run():
+        X, y = load_training_data(os.path.join(paths['output_root'], ALL_CIRCUITS_FILE))
+        model = train_model(X, y)
+        joblib.dump(model, paths['model'])
+        export_forest(model, forest_dir(paths['model']))
+        return {'rows': len(X)}
+    return run
+
+
+# Prédiction par lots : 20 pilotes × 20 positions de départ × 27 conditions météo
+def _stage_prediction(data_root, paths, race_name):
+    from feature_pipeline import DRIVER_PROFILES_PATH
+    from predict_pilot_performance import load_driver_profiles, load_prediction_model, predict_scenarios
+
+    def run():
+        model = load_prediction_model(paths['model'])
+        profiles = load_driver_profiles(os.path.join(paths['output_root'], os.path.basename(DRIVER_PROFILES_PATH)))
+        drivers = profiles['driverId'].head(20).to_list()
+        weather = {'climate_temperature': np.linspace(10, 40, 3), 'gfs_wind_speed': np.linspace(0, 20, 3),
+                   'gfs_humidity': np.linspace(20, 100, 3)}
+        result = predict_scenarios(model, drivers, range(1, 21), weather, profiles)
+        return {'rows': len(result)}
+    return run
+
+
+STAGE_FUNCTIONS = {
+    'ingest': _stage_ingest,
+    'weather_index': _stage_weather_index,
+    'weather_filter': _stage_weather_filter,
+    'race_weather_join': _stage_race_weather_join,
+    'history': _stage_history,
+    'features': _stage_features,
+    'training': _stage_training,
+    'prediction': _stage_prediction,
+}
+
+
+# Exécuter une étape dans le processus courant (appelé dans un sous-processus par run_stage) :
+# durée, pic mémoire du processus et mémoire déjà occupée avant l'étape (interpréteur, imports)
+def measure_stage(stage, data_root, race_name):
+    task = STAGE_FUNCTIONS[stage](data_root, _paths(data_root), race_name)
+    rss_before = process_peak_rss_mb()
+    start = time.perf_counter()
+    info = task()
+    return {
+        'wall_s': time.perf_counter() - start,
+        'peak_rss_mb': process_peak_rss_mb(),
+        'rss_before_mb': rss_before,
+        **info,
+    }
+
+
+# Une étape par sous-processus : le pic mémoire (ru_maxrss) est celui de l'étape seule
+def run_stage(stage, data_root, race_name):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_path = f.name
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--stage', stage, '--data-root', data_root,
+             '--race-name', race_name, '--result-file', result_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if completed.returncode != 0:
+            return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                    f'code de sortie {completed.returncode}'}
+        with open(result_path, encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, stages=STAGES, source_dir='.', work_dir=DEFAULT_OUTPUT_DIR,
+                   race_name=None, weather_rows=None, seed=0):
+    from race_results_processing import RACE_NAME
+    race_name = race_name or RACE_NAME
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scales': {},
+    }
+    for scale in scales:
+        data_root = scale_dir(work_dir, scale)
+        start = time.perf_counter()
+        rows = generate_dataset(source_dir, data_root, scale, weather_rows and weather_rows * scale, seed)
+        print(f'× {scale} : données générées en {time.perf_counter() - start:.1f}s '
+              f"(results {rows.get('results', 0)}, driver_standings {rows.get('driver_standings', 0)}, "
+              f"pit_stops {rows.get('pit_stops', 0)} lignes)")
+
+        stage_results = {}
+        for stage in stages:
+            stage_results[stage] = result = run_stage(stage, data_root, race_name)
+            if 'error' in result:
+                print(f'  {stage:<18} ERREUR : {result["error"]}')
+            else:
+                print(f"  {stage:<18} {result['wall_s']:9.3f}s  {result['peak_rss_mb']:8.0f} Mo")
+        results['scales'][str(scale)] = {'rows': rows, 'stages': stage_results}
+    return results
+
+
+# Comparer deux séries de mesures : une régression est un dépassement de la référence de plus
+# de `tolerance` (en relatif) sur la durée ou le pic mémoire, au-delà du bruit de mesure
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for scale, current in results['scales'].items():
+        reference = baseline.get('scales', {}).get(scale)
+        if reference is None:
+            continue
+        for stage, measure in current['stages'].items():
+            ref = reference['stages'].get(stage)
+            if ref is None or 'error' in ref:
+                continue
+            if 'error' in measure:
+                regressions.append({'scale': scale, 'stage': stage, 'metric': 'error', 'baseline': None,
+                                    'current': measure['error']})
+                continue
+            for metric, floor in (('wall_s', MIN_WALL_S), ('peak_rss_mb', MIN_RSS_MB)):
+                if measure[metric] is None or ref[metric] is None:
+                    continue
+                if measure[metric] > ref[metric] * (1 + tolerance) and measure[metric] - ref[metric] > floor:
+                    regressions.append({'scale': scale, 'stage': stage, 'metric': metric, 'baseline': ref[metric],
+                                        'current': measure[metric], 'ratio': measure[metric] / ref[metric]})
+    return regressions
+
+
+def write_json(data, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Mesurer chaque étape (durée, pic mémoire) sur des données synthétiques à plusieurs échelles')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                        help='Multiples de la taille des CSV actuels')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='Étapes à mesurer')
+    parser.add_argument('--source-dir', default='.', help='Dossier des CSV Ergast servant de modèle')
+    parser.add_argument('--work-dir', default=DEFAULT_OUTPUT_DIR, help='Dossier des données générées')
+    parser.add_argument('--race-name', help='Grand Prix de l\'étape race_weather_join')
+    parser.add_argument('--weather-rows', type=int, default=WEATHER_ROWS_PER_SCALE,
+                        help='Observations météo par unité d\'échelle')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Fichier JSON des résultats (results_<date>.json dans --work-dir par défaut)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='Résultats de référence (JSON)')
+    parser.add_argument('--save-baseline', action='store_true', help='Enregistrer ces résultats comme référence')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Écart relatif toléré avant de signaler une régression')
+    # Exécution d'une seule étape (sous-processus lancé par run_stage)
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--data-root', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        write_json(measure_stage(args.stage, args.data_root, args.race_name), args.result_file)
+        sys.exit(0)
+
+    results = run_benchmarks(args.scales, args.stages, args.source_dir, args.work_dir, args.race_name,
+                             args.weather_rows, args.seed)
+    output = args.output or os.path.join(args.work_dir, f"results_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    write_json(results, output)
+    print(f'Résultats écrits dans {output}')
+
+    if args.save_baseline:
+        write_json(results, args.baseline)
+        print(f'Référence enregistrée dans {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        for r in regressions:
+            if r['metric'] == 'error':
+                print(f"RÉGRESSION × {r['scale']} {r['stage']} : échec ({r['current']})")
+            else:
+                print(f"RÉGRESSION × {r['scale']} {r['stage']} {r['metric']} : "
+                      f"{r['baseline']:.3f} → {r['current']:.3f} (× {r['ratio']:.2f})")
+        if regressions:
+            sys.exit(1)
+        print(f'Aucune régression par rapport à {args.baseline} (tolérance {args.tolerance:.0%})')
@@ -1,41 +1,61 @@
-import polars as pl
-import pandas as pd
-from datetime import datetime, timezone
-
-# Charger les fichiers météo et résultats des courses de Singapour
-df_singapore_weather = pl.read_csv('C:/Users/mazgo/Downloads/csv/singapore_weather.csv')
-df_singapore_results = pl.read_csv('C:/Users/mazgo/Downloads/csv/singapore_race_results.csv')
-
-# Convertir le DataFrame Polars en Pandas pour transformer le timestamp
-df_singapore_weather_pandas = df_singapore_weather.to_pandas()
-
-# Convertir le timestamp en format 'YYYY-MM-DD' dans Pandas
-df_singapore_weather_pandas['date'] = df_singapore_weather_pandas['fact_time'].apply(
-    lambda x: datetime.fromtimestamp(x, timezone.utc).strftime('%Y-%m-%d')
-)
-
-# Revenir à Polars après la transformation
-df_singapore_weather = pl.from_pandas(df_singapore_weather_pandas)
+import datetime
 
-# Supprimer la colonne 'fact_time' (ancien timestamp) car elle n'est plus nécessaire
-df_singapore_weather = df_singapore_weather.drop('fact_time')
-
-# Filtrer uniquement les résultats de la course principale à Singapour (toutes les années)
-df_singapore_results_filtered = df_singapore_results.filter(
-    (pl.col('positionOrder').is_not_null())  # Filtrer uniquement les résultats de la course principale
-)
-
-# Joindre les données météo avec les résultats de la course de Singapour sur la colonne "date"
-df_combined = df_singapore_results_filtered.join(df_singapore_weather, how='inner', on=['date'])
-
-# Vérifier les doublons après la jointure
-if df_combined.is_duplicated().sum() > 0:
-    print(f"Nombre de doublons avant suppression : {df_combined.is_duplicated().sum()}")
-    # Supprimer les doublons
-    df_combined = df_combined.unique()
-
-# Afficher les premières lignes pour vérifier la jointure
-print(df_combined.head())
+import polars as pl
 
-# Sauvegarder les données combinées
-df_combined.write_csv('C:/Users/mazgo/Downloads/singapore_combined_data_all_years.csv')
+# Colonnes météo conservées dans la table de features
+WEATHER_COLUMNS = ['climate_temperature', 'fact_temperature', 'gfs_pressure', 'gfs_humidity', 'gfs_wind_speed']
+
+# Écart maximal entre le départ de la course et l'observation météo retenue
+WEATHER_TOLERANCE = '12h'
+
+# Heure de départ (UTC) utilisée quand races.csv ne la donne pas (courses anciennes)
+DEFAULT_RACE_TIME = datetime.time(12, 0)
+
+
+# Instant de départ de la course (UTC) : date + heure de races.csv
+def race_start_expr(date_col='date', time_col='race_time'):
+    return (
+        pl.col(date_col).dt.combine(pl.col(time_col).fill_null(DEFAULT_RACE_TIME))
+        .cast(pl.Datetime('us')).alias('race_start')
+    )
+
+
+# Observations météo regroupées par (circuit, instant) : moyenne des stations du rayon,
+# avec le timestamp (secondes UTC) converti en datetime de façon vectorisée
+def weather_by_time(df_weather):
+    return (
+        df_weather.lazy()
+        .group_by('circuitId', 'fact_time')
+        .agg(pl.col(WEATHER_COLUMNS).mean())
+        .select(
+            'circuitId',
+            pl.from_epoch('fact_time', time_unit='s').cast(pl.Datetime('us')).alias('weather_time'),
+            *WEATHER_COLUMNS,
+        )
+        .sort('weather_time')
+    )
+
+
+# Associer à chaque résultat de course la météo la plus proche du départ (date + heure de
+# races.csv) sur son circuit, à moins de `tolerance` : jointure as-of triée, au plus une
+# ligne météo par résultat (pas de produit résultats × observations du jour)
+def combine_weather_and_race(df_results, df_weather, tolerance=WEATHER_TOLERANCE):
+    # Filtrer uniquement les résultats de la course principale (toutes les années)
+    df_results_filtered = df_results.lazy().filter(pl.col('positionOrder').is_not_null()).with_columns(race_start_expr())
+
+    # Les deux côtés sont triés sur l'instant juste avant la jointure
+    return (
+        df_results_filtered
+        .sort('race_start')
+        .join_asof(weather_by_time(df_weather), left_on='race_start', right_on='weather_time', by='circuitId',
+                   strategy='nearest', tolerance=tolerance, check_sortedness=False)
+        # Courses sans observation assez proche : ignorées, comme avec l'ancienne jointure interne
+        .filter(pl.col('weather_time').is_not_null())
+        .drop('race_start', 'weather_time')
+    )
+
+
+if __name__ == '__main__':
+    # Exécuter le pipeline jusqu'à cette étape et sauvegarder les données combinées
+    from feature_pipeline import main
+    main(until='weather')
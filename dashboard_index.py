@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Colonnes des résultats utilisées par le dashboard
+RESULT_COLUMNS = ['raceId', 'driverId', 'grid', 'positionOrder', 'points', 'laps', 'milliseconds']
+
+# Nombre de pilotes affichés dans le classement d'un circuit
+LEADERBOARD_SIZE = 10
+
+
+# Bornes [début, fin) des groupes consécutifs d'un tableau trié sur les clés données
+def _group_bounds(*keys):
+    n_rows = len(keys[0])
+    change = np.zeros(max(n_rows - 1, 0), dtype=bool)
+    for key in keys:
+        change |= key[1:] != key[:-1]
+    starts = np.concatenate([[0], np.flatnonzero(change) + 1]) if n_rows else np.array([], dtype=np.int64)
+    stops = np.concatenate([starts[1:], [n_rows]]) if n_rows else starts
+    return starts, stops
+
+
+# Index construit une seule fois par processus : toutes les recherches faites à chaque
+# interaction (circuit par nom, pilote par nom, résultats d'un circuit ou d'un pilote sur
+# un circuit, classement) deviennent des accès à un dictionnaire ou à une tranche, sans
+# parcourir la table des résultats
+class DashboardIndex:
+    def __init__(self, circuits_df, drivers_df, results_df, races_df):
+        # Noms → identifiants (première occurrence, comme la recherche par masque d'origine)
+        circuits = circuits_df.drop_duplicates('name', keep='first')
+        self.circuits_by_name = {
+            name: (int(circuit_id), float(lat), float(lng))
+            for name, circuit_id, lat, lng in zip(circuits['name'], circuits['circuitId'], circuits['lat'], circuits['lng'])
+        }
+        drivers = drivers_df.drop_duplicates('surname', keep='first')
+        self.driver_ids_by_surname = dict(zip(drivers['surname'], drivers['driverId'].astype(int)))
+
+        # circuitId → raceIds
+        self.race_ids_by_circuit = {
+            int(circuit_id): race_ids.to_numpy()
+            for circuit_id, race_ids in races_df.groupby('circuitId', sort=False)['raceId']
+        }
+
+        # Résultats triés par (circuit, pilote, année) : chaque circuit et chaque couple
+        # (circuit, pilote) occupe une tranche contiguë de la table
+        results = results_df[RESULT_COLUMNS].merge(races_df[['raceId', 'circuitId', 'year']], on='raceId', how='inner')
+        self.results = results.sort_values(['circuitId', 'driverId', 'year'], kind='stable').reset_index(drop=True)
+
+        circuit_ids = self.results['circuitId'].to_numpy()
+        driver_ids = self.results['driverId'].to_numpy()
+        starts, stops = _group_bounds(circuit_ids)
+        self.circuit_slices = {int(circuit_ids[s]): slice(int(s), int(e)) for s, e in zip(starts, stops)}
+        starts, stops = _group_bounds(circuit_ids, driver_ids)
+        self.driver_slices = {
+            (int(circuit_ids[s]), int(driver_ids[s])): slice(int(s), int(e)) for s, e in zip(starts, stops)
+        }
+
+        # Classement précalculé de chaque circuit (position moyenne par pilote)
+        leaderboard = (
+            self.results.groupby(['circuitId', 'driverId'], sort=False)['positionOrder'].mean().reset_index()
+            .merge(drivers_df[['driverId', 'surname']], on='driverId')
+            .sort_values(['circuitId', 'positionOrder'], kind='stable')
+        )
+        self.leaderboards = {
+            int(circuit_id): df.head(LEADERBOARD_SIZE).reset_index(drop=True)
+            for circuit_id, df in leaderboard.groupby('circuitId', sort=False)
+        }
+
+    def circuit(self, name):
+        return self.circuits_by_name[name]
+
+    def driver_id(self, surname):
+        return self.driver_ids_by_surname[surname]
+
+    def race_ids(self, circuit_id):
+        return self.race_ids_by_circuit.get(circuit_id, np.array([], dtype=np.int32))
+
+    def circuit_results(self, circuit_id):
+        return self.results.iloc[self.circuit_slices.get(circuit_id, slice(0, 0))]
+
+    # Résultats du pilote sur le circuit, triés par année
+    def driver_results(self, circuit_id, driver_id):
+        return self.results.iloc[self.driver_slices.get((circuit_id, driver_id), slice(0, 0))]
+
+    # Grille de départ de la dernière course disputée sur le circuit : (driverIds, positions)
+    def last_grid(self, circuit_id):
+        results = self.circuit_results(circuit_id)
+        if results.empty:
+            return [], []
+        last_race = results[results['year'] == results['year'].max()]
+        last_race = last_race[last_race['raceId'] == last_race['raceId'].max()]
+        # Départ depuis la voie des stands (grid = 0) : derrière toute la grille
+        grid = last_race['grid'].where(last_race['grid'] > 0, len(last_race))
+        order = np.argsort(grid.to_numpy(), kind='stable')
+        return last_race['driverId'].to_numpy()[order].tolist(), grid.to_numpy()[order].tolist()
+
+    def leaderboard(self, circuit_id):
+        return self.leaderboards.get(circuit_id, pd.DataFrame(columns=['circuitId', 'driverId', 'positionOrder', 'surname']))
@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import time
+import urllib.error
+import urllib.request
+
+# Dossier du cache local (adressé par contenu) et dossier local servant de source hors ligne
+CACHE_DIR_ENV = 'F1_DATA_CACHE'
+LOCAL_DIR_ENV = 'F1_DATA_DIR'
+DEFAULT_CACHE_DIR = 'data_cache'
+
+# Taille des blocs lus / téléchargés (octets)
+CHUNK_SIZE = 1 << 20
+
+# Reprises d'un téléchargement interrompu (à partir de l'octet déjà reçu)
+MAX_RETRIES = 5
+RETRY_DELAY_S = 1.0
+HTTP_TIMEOUT_S = 60
+
+REFS_FILE = 'refs.json'
+
+# Marqueur de début et de fin d'un fichier Parquet : un fichier tronqué n'a pas le second
+PARQUET_MAGIC = b'PAR1'
+
+# Jeux de données connus : URL de téléchargement et empreinte SHA-256 attendue.
+# Sans empreinte, celle du premier téléchargement complet est enregistrée (refs.json du
+# cache) puis vérifiée ensuite : la recopier ici pour l'exiger dès le premier téléchargement.
+DATASETS = {
+    'weather_sample.parquet': {
+        # Échantillon météo hébergé sur Google Drive (confirm=t : pas de page d'avertissement)
+        'url': 'https://drive.usercontent.google.com/download?id=1A9duZC6CUH6aBfGKZ9wRe_UKlmdS9O8l'
+               '&export=download&confirm=t',
+        'sha256': None,
+    },
+}
+
+
+# Empreinte SHA-256 d'un fichier, lue par blocs pour ne pas charger tout le fichier
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Taille totale annoncée par le serveur : Content-Range d'une réponse partielle (206)
+# ("bytes 1000-2999/3000"), sinon Content-Length ; None si elle est inconnue
+def expected_size(response):
+    if response.status == 206:
+        total = (response.headers.get('Content-Range') or '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+
+# Contrôle d'un fichier reçu en entier : un Parquet doit commencer et finir par PAR1
+def check_complete(name, path):
+    if os.path.splitext(name)[1] != '.parquet':
+        return
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(len(PARQUET_MAGIC))
+        f.seek(max(0, size - len(PARQUET_MAGIC)))
+        tail = f.read()
+    if size < 2 * len(PARQUET_MAGIC) or head != PARQUET_MAGIC or tail != PARQUET_MAGIC:
+        raise ValueError(f'{name} : fichier Parquet incomplet ou corrompu ({size} octets)')
+
+
+# Source locale : un dossier contenant les fichiers sous leur nom (copie d'un partage réseau,
+# données de test...). Aucun accès réseau.
+class LocalDirectoryProvider:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __repr__(self):
+        return f'LocalDirectoryProvider({self.directory!r})'
+
+    # Copier le fichier à partir de l'octet `offset` : blocs écrits à la suite de `f`
+    def fetch(self, name, f, offset=0):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        if offset > os.path.getsize(path):
+            # Fichier partiel plus long que la source : tout recommencer
+            f.seek(0)
+            f.truncate()
+            offset = 0
+        with open(path, 'rb') as source:
+            source.seek(offset)
+            shutil.copyfileobj(source, f, CHUNK_SIZE)
+
+
+# Source HTTP(S) : téléchargement par blocs, repris avec un en-tête Range après une coupure
+class HttpProvider:
+    def __init__(self, urls, timeout=HTTP_TIMEOUT_S):
+        self.urls = urls
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f'HttpProvider({sorted(self.urls)!r})'
+
+    def fetch(self, name, f, offset=0):
+        if name not in self.urls:
+            raise FileNotFoundError(name)
+        request = urllib.request.Request(self.urls[name], headers={'Range': f'bytes={offset}-'} if offset else {})
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            # Range au-delà de la fin : le fichier partiel est déjà complet
+            if e.code == 416 and offset:
+                return
+            raise
+        with response:
+            if offset and response.status != 206:
+                # Le serveur ignore Range : tout recommencer
+                f.seek(0)
+                f.truncate()
+            total = expected_size(response)
+            try:
+                shutil.copyfileobj(response, f, CHUNK_SIZE)
+            except http.client.IncompleteRead as e:
+                raise ConnectionError(f'{name} : réponse incomplète ({e})') from e
+        # Connexion fermée avant la fin : erreur réseau, le transfert est repris à partir de f.tell()
+        if total is not None and f.tell() != total:
+            raise ConnectionError(f'{name} : {f.tell()} octets reçus sur {total}')
+
+
+# Cache local adressé par contenu : chaque fichier est rangé sous son empreinte SHA-256
+# (objects/ab/abcd….parquet), refs.json associe les noms aux empreintes. Les téléchargements
+# en cours sont gardés dans partial/ et repris là où ils se sont arrêtés.
+class ContentStore:
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+
+    def object_path(self, sha256, name=''):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256 + os.path.splitext(name)[1])
+
+    def partial_path(self, name):
+        return os.path.join(self.root, 'partial', name + '.part')
+
+    def refs(self):
+        try:
+            with open(os.path.join(self.root, REFS_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_ref(self, name, sha256, size):
+        refs = self.refs()
+        refs[name] = {'sha256': sha256, 'size': size}
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, REFS_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(refs, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, REFS_FILE))
+
+    # Chemin du fichier en cache, ou None. La taille est toujours contrôlée ;
+    # verify=True recalcule aussi l'empreinte (lecture complète du fichier).
+    def lookup(self, name, sha256=None, verify=False):
+        ref = self.refs().get(name)
+        if ref is None or (sha256 is not None and ref['sha256'] != sha256):
+            return None
+        path = self.object_path(ref['sha256'], name)
+        if not os.path.exists(path) or os.path.getsize(path) != ref['size']:
+            return None
+        if verify and file_sha256(path) != ref['sha256']:
+            os.remove(path)
+            return None
+        return path
+
+    # Ajouter au cache un fichier complet (déplacé), après vérification de son format et de son empreinte
+    def add(self, name, path, sha256=None):
+        try:
+            check_complete(name, path)
+        except ValueError:
+            os.remove(path)
+            raise
+        actual = file_sha256(path)
+        if sha256 is not None and actual != sha256:
+            os.remove(path)
+            raise ValueError(f'{name} : empreinte {actual} différente de celle attendue ({sha256})')
+        target = self.object_path(actual, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        self._write_ref(name, actual, os.path.getsize(target))
+        return target
+
+    # Télécharger un fichier depuis une source, avec reprise après une coupure : le fichier
+    # partiel est prolongé à partir de sa taille actuelle (aussi d'une exécution à l'autre)
+    def fetch(self, name, provider, sha256=None, retries=MAX_RETRIES):
+        partial = self.partial_path(name)
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        for attempt in range(retries + 1):
+            try:
+                with open(partial, 'ab') as f:
+                    provider.fetch(name, f, f.tell())
+                break
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                if (isinstance(e, urllib.error.HTTPError) and e.code < 500) or attempt == retries:
+                    raise
+                print(f'{name} : transfert interrompu ({e}), reprise à {os.path.getsize(partial)} octets')
+                time.sleep(RETRY_DELAY_S * 2 ** attempt)
+        try:
+            return self.add(name, partial, sha256)
+        except ValueError:
+            # Contenu corrompu : le prochain essai repart de zéro
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+
+# Fournisseur de données local d'abord : le cache, puis chaque source dans l'ordre
+# (dossier local, puis réseau) ; le premier fichier obtenu et vérifié est gardé en cache
+class DataProvider:
+    def __init__(self, store, providers, datasets=DATASETS):
+        self.store = store
+        self.providers = providers
+        self.datasets = datasets
+
+    def path(self, name, verify=False):
+        sha256 = self.datasets.get(name, {}).get('sha256')
+        path = self.store.lookup(name, sha256, verify)
+        if path is not None:
+            return path
+
+        errors = []
+        for provider in self.providers:
+            try:
+                return self.store.fetch(name, provider, sha256)
+            except (OSError, ValueError) as e:
+                errors.append(f'{provider!r} : {e}')
+        raise FileNotFoundError(f"{name} introuvable ({'; '.join(errors) or 'aucune source configurée'})")
+
+    # Placer le fichier à l'emplacement attendu par les scripts (lien physique vers le cache,
+    # copie si le lien est impossible) ; un fichier déjà présent est utilisé tel quel
+    def materialize(self, name, target=None):
+        target = target or name
+        if os.path.exists(target):
+            return target
+        path = self.path(name)
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        tmp_path = target + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        return target
+
+
+# Fournisseur configuré par l'environnement : cache F1_DATA_CACHE, dossier F1_DATA_DIR
+# (s'il est défini) puis téléchargement des jeux de données connus
+def default_provider(network=True):
+    providers = []
+    if os.environ.get(LOCAL_DIR_ENV):
+        providers.append(LocalDirectoryProvider(os.environ[LOCAL_DIR_ENV]))
+    if network:
+        providers.append(HttpProvider({name: spec['url'] for name, spec in DATASETS.items() if spec.get('url')}))
+    return DataProvider(ContentStore(os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)), providers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Récupérer un jeu de données dans le cache local (local d\'abord)')
+    parser.add_argument('names', nargs='*', default=sorted(DATASETS), help='Fichiers à récupérer')
+    parser.add_argument('--target-dir', default='.', help='Dossier où placer les fichiers')
+    parser.add_argument('--offline', action='store_true', help='Sans réseau : cache et F1_DATA_DIR uniquement')
+    parser.add_argument('--verify', action='store_true', help="Recalculer l'empreinte des fichiers en cache")
+    args = parser.parse_args()
+
+    provider = default_provider(network=not args.offline)
+    for name in args.names:
+        start = time.perf_counter()
+        path = provider.path(name, verify=args.verify)
+        target = provider.materialize(name, os.path.join(args.target_dir, name))
+        print(f'{name} : {path} -> {target} ({time.perf_counter() - start:.2f}s)')
@@ -0,0 +1,176 @@
+import argparse
+import os
+import time
+
+import polars as pl
+
+# Dossier des fichiers CSV Ergast bruts et dossier du magasin typé (Arrow IPC)
+DEFAULT_CSV_DIR = '.'
+DEFAULT_DATA_DIR = 'data'
+
+# Marqueur de valeur manquante utilisé dans les CSV Ergast
+NULL_MARKER = '\\N'
+
+_ID = pl.Int32
+_INT = pl.Int32
+_STR = pl.String
+
+# Schéma typé de chaque table : les colonnes numériques stockées en texte dans les CSV
+# (position, milliseconds, number...) deviennent de vrais entiers nullables.
+# Les temps au tour (q1..q3, fastestLapTime, duration) restent du texte à ce stade.
+TABLE_SCHEMAS = {
+    'circuits': {
+        'circuitId': _ID, 'circuitRef': _STR, 'name': _STR, 'location': _STR, 'country': _STR,
+        'lat': pl.Float64, 'lng': pl.Float64, 'alt': _INT, 'url': _STR,
+    },
+    'constructor_results': {
+        'constructorResultsId': _ID, 'raceId': _ID, 'constructorId': _ID, 'points': pl.Float64, 'status': _STR,
+    },
+    'constructor_standings': {
+        'constructorStandingsId': _ID, 'raceId': _ID, 'constructorId': _ID, 'points': pl.Float64,
+        'position': _INT, 'positionText': _STR, 'wins': _INT,
+    },
+    'constructors': {
+        'constructorId': _ID, 'constructorRef': _STR, 'name': _STR, 'nationality': _STR, 'url': _STR,
+    },
+    'driver_standings': {
+        'driverStandingsId': _ID, 'raceId': _ID, 'driverId': _ID, 'points': pl.Float64,
+        'position': _INT, 'positionText': _STR, 'wins': _INT,
+    },
+    'drivers': {
+        'driverId': _ID, 'driverRef': _STR, 'number': _INT, 'code': _STR, 'forename': _STR,
+        'surname': _STR, 'dob': pl.Date, 'nationality': _STR, 'url': _STR,
+    },
+    'pit_stops': {
+        'raceId': _ID, 'driverId': _ID, 'stop': _INT, 'lap': _INT, 'time': _STR, 'duration': _STR,
+        'milliseconds': pl.Int64,
+    },
+    'qualifying': {
+        'qualifyId': _ID, 'raceId': _ID, 'driverId': _ID, 'constructorId': _ID, 'number': _INT,
+        'position': _INT, 'q1': _STR, 'q2': _STR, 'q3': _STR,
+    },
+    'races': {
+        'raceId': _ID, 'year': _INT, 'round': _INT, 'circuitId': _ID, 'name': _STR, 'date': pl.Date,
+        'time': pl.Time, 'url': _STR,
+        'fp1_date': pl.Date, 'fp1_time': pl.Time, 'fp2_date': pl.Date, 'fp2_time': pl.Time,
+        'fp3_date': pl.Date, 'fp3_time': pl.Time, 'quali_date': pl.Date, 'quali_time': pl.Time,
+        'sprint_date': pl.Date, 'sprint_time': pl.Time,
+    },
+    'results': {
+        'resultId': _ID, 'raceId': _ID, 'driverId': _ID, 'constructorId': _ID, 'number': _INT,
+        'grid': _INT, 'position': _INT, 'positionText': _STR, 'positionOrder': _INT, 'points': pl.Float64,
+        'laps': _INT, 'time': _STR, 'milliseconds': pl.Int64, 'fastestLap': _INT, 'rank': _INT,
+        'fastestLapTime': _STR, 'fastestLapSpeed': pl.Float64, 'statusId': _ID,
+    },
+    'seasons': {
+        'year': _INT, 'url': _STR,
+    },
+    'sprint_results': {
+        'resultId': _ID, 'raceId': _ID, 'driverId': _ID, 'constructorId': _ID, 'number': _INT,
+        'grid': _INT, 'position': _INT, 'positionText': _STR, 'positionOrder': _INT, 'points': pl.Float64,
+        'laps': _INT, 'time': _STR, 'milliseconds': pl.Int64, 'fastestLap': _INT,
+        'fastestLapTime': _STR, 'statusId': _ID,
+    },
+    'status': {
+        'statusId': _ID, 'status': _STR,
+    },
+}
+
+
+def csv_path(table, csv_dir=DEFAULT_CSV_DIR):
+    return os.path.join(csv_dir, f'{table}.csv')
+
+
+def store_path(table, data_dir=DEFAULT_DATA_DIR):
+    return os.path.join(data_dir, f'{table}.arrow')
+
+
+def _schema(table):
+    if table not in TABLE_SCHEMAS:
+        raise KeyError(f"Table inconnue : {table!r} (attendu : {', '.join(sorted(TABLE_SCHEMAS))})")
+    return TABLE_SCHEMAS[table]
+
+
+# Lire un CSV Ergast avec son schéma : '\N' devient null, les colonnes sont typées explicitement
+def read_csv_typed(table, csv_dir=DEFAULT_CSV_DIR):
+    schema = _schema(table)
+    return pl.read_csv(
+        csv_path(table, csv_dir),
+        columns=list(schema),
+        schema_overrides=schema,
+        null_values=NULL_MARKER,
+    ).select(list(schema))
+
+
+# Le fichier Arrow est à jour s'il existe et n'est pas plus ancien que le CSV source
+def store_is_fresh(table, csv_dir=DEFAULT_CSV_DIR, data_dir=DEFAULT_DATA_DIR):
+    path = store_path(table, data_dir)
+    if not os.path.exists(path):
+        return False
+    source = csv_path(table, csv_dir)
+    return not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+# Ingestion unique : convertir chaque CSV en fichier Arrow IPC non compressé (mappable en mémoire)
+def ingest_tables(tables=None, csv_dir=DEFAULT_CSV_DIR, data_dir=DEFAULT_DATA_DIR, force=False):
+    os.makedirs(data_dir, exist_ok=True)
+    written = []
+    for table in tables or TABLE_SCHEMAS:
+        if not force and store_is_fresh(table, csv_dir, data_dir):
+            continue
+        if not os.path.exists(csv_path(table, csv_dir)):
+            print(f'{table}: CSV introuvable, ignoré')
+            continue
+        start = time.perf_counter()
+        df = read_csv_typed(table, csv_dir)
+        tmp_path = store_path(table, data_dir) + '.tmp'
+        df.write_ipc(tmp_path, compression='uncompressed')
+        os.replace(tmp_path, store_path(table, data_dir))
+        written.append(table)
+        print(f'{table}: {df.height} lignes en {time.perf_counter() - start:.3f}s')
+    return written
+
+
+# Charger une table typée : le fichier Arrow non compressé est mappé en mémoire par Polars
+# s'il est à jour, sinon lecture typée du CSV (même schéma, mêmes nulls)
+def load_table(table, csv_dir=DEFAULT_CSV_DIR, data_dir=DEFAULT_DATA_DIR):
+    if store_is_fresh(table, csv_dir, data_dir):
+        return pl.read_ipc(store_path(table, data_dir))
+    return read_csv_typed(table, csv_dir)
+
+
+# Version paresseuse (LazyFrame) pour les pipelines Polars
+def scan_table(table, csv_dir=DEFAULT_CSV_DIR, data_dir=DEFAULT_DATA_DIR):
+    if store_is_fresh(table, csv_dir, data_dir):
+        return pl.scan_ipc(store_path(table, data_dir))
+    schema = _schema(table)
+    return pl.scan_csv(
+        csv_path(table, csv_dir), schema_overrides=schema, null_values=NULL_MARKER,
+    ).select(list(schema))
+
+
+# Version des données d'un ensemble de tables (dates de modification des fichiers lus),
+# utilisée comme clé des résultats mis en cache à partir de ces tables
+def tables_version(tables, csv_dir=DEFAULT_CSV_DIR, data_dir=DEFAULT_DATA_DIR):
+    version = []
+    for table in tables:
+        path = store_path(table, data_dir) if store_is_fresh(table, csv_dir, data_dir) else csv_path(table, csv_dir)
+        version.append(os.path.getmtime(path) if os.path.exists(path) else None)
+    return tuple(version)
+
+
+# Version pandas pour le dashboard (conversion via Arrow)
+def load_table_pandas(table, csv_dir=DEFAULT_CSV_DIR, data_dir=DEFAULT_DATA_DIR):
+    return load_table(table, csv_dir, data_dir).to_pandas()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convertir les CSV Ergast en fichiers Arrow IPC typés')
+    parser.add_argument('tables', nargs='*', help='Tables à convertir (toutes par défaut)')
+    parser.add_argument('--csv-dir', default=DEFAULT_CSV_DIR, help='Dossier des fichiers CSV')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='Dossier de sortie des fichiers Arrow')
+    parser.add_argument('--force', action='store_true', help='Reconvertir même les tables à jour')
+    args = parser.parse_args()
+
+    written = ingest_tables(args.tables or None, args.csv_dir, args.data_dir, args.force)
+    print(f'{len(written)} table(s) convertie(s) dans {args.data_dir}')
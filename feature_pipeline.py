@@ -0,0 +1,379 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import polars as pl
+
+from add_pilot_history import (
+    HISTORY_FEATURES, add_pilot_history, driver_history, driver_profiles, driver_state, join_driver_history,
+)
+from combine_weather_and_race import WEATHER_COLUMNS, combine_weather_and_race
+from data_store import ingest_tables, scan_table
+from feature_store import (
+    append_features, load_driver_state, read_manifest, reset_store, same_weather, weather_fingerprint,
+)
+from instrumentation import span
+from race_results_processing import RACE_NAME, race_filter, race_results
+from timing_parser import TIMING_FEATURES, add_timing_features
+from weather_cache import DEFAULT_CACHE_DIR, cache_is_fresh, partition_path
+from weather_index import DEFAULT_RADIUS_KM, ensure_weather_index, scan_weather_radius
+
+# Racines configurables : données d'entrée (CSV Ergast + magasin Arrow) et sorties
+DEFAULT_DATA_ROOT = '.'
+DEFAULT_OUTPUT_ROOT = 'output'
+DEFAULT_WEATHER_PATH = 'weather_sample.parquet'
+DEFAULT_MODEL_PATH = os.path.join(DEFAULT_OUTPUT_ROOT, 'f1_prediction_model_with_pilot_history.pkl')
+
+# Colonnes d'entrée du modèle (dans cet ordre) et cible
+FEATURE_COLUMNS = [
+    'climate_temperature',
+    'gfs_wind_speed',
+    'gfs_humidity',
+    'grid',  # Position de départ
+    'total_wins',  # Total des victoires du pilote
+    'total_points',  # Points cumulés du pilote
+    'total_podiums',  # Podiums du pilote
+    'average_position',  # Position moyenne du pilote
+]
+TARGET_COLUMN = 'position'
+
+# Colonnes de la table de features finale
+OUTPUT_COLUMNS = [
+    'raceId', 'driverId', 'circuitId', 'year', 'date',
+    *WEATHER_COLUMNS,
+    'grid', *HISTORY_FEATURES,
+    *TIMING_FEATURES,
+    'position', 'positionOrder', 'points',
+]
+
+# Étapes du pipeline, dans l'ordre
+STAGES = ('race_results', 'weather', 'pilot_history', 'features')
+
+
+# Table combinée de tous les circuits (mode --all-circuits)
+ALL_CIRCUITS_FILE = 'all_circuits_features.parquet'
+
+# Profils des pilotes précalculés pour les prédictions (voir predict_pilot_performance.py)
+DRIVER_PROFILES_PATH = os.path.join(DEFAULT_OUTPUT_ROOT, 'driver_profiles.parquet')
+
+
+def race_slug(race_name, circuit_id=None):
+    if circuit_id is not None:
+        return f'circuit_{circuit_id}'
+    return race_name.removesuffix(' Grand Prix').lower().replace(' ', '_')
+
+
+def features_path(output_root=DEFAULT_OUTPUT_ROOT, race_name=RACE_NAME, circuit_id=None):
+    return os.path.join(output_root, f'{race_slug(race_name, circuit_id)}_features.parquet')
+
+
+# Magasin de features partitionné, alimenté de façon incrémentale
+def store_dir(output_root=DEFAULT_OUTPUT_ROOT, race_name=RACE_NAME, circuit_id=None):
+    return os.path.join(output_root, 'feature_store', race_slug(race_name, circuit_id))
+
+
+def stage_path(output_root, race_name, stage, circuit_id=None):
+    if stage == 'features':
+        return features_path(output_root, race_name, circuit_id)
+    return os.path.join(output_root, f'{race_slug(race_name, circuit_id)}_{stage}.parquet')
+
+
+# Chronométrage des étapes : liste de (étape, secondes), chaque étape est aussi un span
+# (trace et métriques exportées avec F1_TRACE_DIR, voir instrumentation.py)
+class StageTimer:
+    def __init__(self):
+        self.timings = []
+
+    def run(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        with span(f'pipeline.{stage}'):
+            result = func(*args, **kwargs)
+        self.timings.append((stage, time.perf_counter() - start))
+        return result
+
+    def report(self):
+        width = max(len(stage) for stage, _ in self.timings)
+        for stage, seconds in self.timings:
+            print(f'  {stage:<{width}}  {seconds * 1000:9.1f} ms')
+        print(f"  {'total':<{width}}  {sum(s for _, s in self.timings) * 1000:9.1f} ms")
+
+
+# Observations météo autour des circuits d'un Grand Prix (ou d'un circuit) : partitions du
+# cache si elles sont à jour, sinon requête par rayon sur l'index spatial (toujours en LazyFrame)
+def scan_race_weather(data_root, weather_path, race_name, radius_km=DEFAULT_RADIUS_KM,
+                      cache_dir=DEFAULT_CACHE_DIR, circuit_id=None):
+    circuits = (
+        scan_table('races', data_root, os.path.join(data_root, 'data'))
+        .filter(race_filter(race_name, circuit_id))
+        .select('circuitId').unique()
+        .join(scan_table('circuits', data_root, os.path.join(data_root, 'data')), on='circuitId')
+        .select('circuitId', 'lat', 'lng')
+        .collect()
+    )
+    columns = ['fact_time', *WEATHER_COLUMNS]
+    use_cache = cache_is_fresh(weather_path, cache_dir, radius_km)
+
+    frames = []
+    for circuit in circuits.iter_rows(named=True):
+        if use_cache:
+            lf = pl.scan_parquet(partition_path(cache_dir, circuit['circuitId'])).select(columns)
+        else:
+            lf = scan_weather_radius(weather_path, circuit['lat'], circuit['lng'], radius_km, columns=columns)
+        # Chaque observation garde son circuit : la jointure avec les courses se fait par circuit
+        frames.append(lf.with_columns(pl.lit(circuit['circuitId'], pl.Int32).alias('circuitId')))
+    if not frames:
+        return pl.LazyFrame(schema={'fact_time': pl.Int64, **{c: pl.Float64 for c in WEATHER_COLUMNS},
+                                    'circuitId': pl.Int32})
+    return pl.concat(frames)
+
+
+# Construire le plan complet (LazyFrame) de la table de features.
+# Avec materialize=True, chaque étape est calculée à part pour mesurer son coût
+# (diagnostic uniquement : Polars ne peut alors plus optimiser entre les étapes).
+# exclude_race_ids et history servent au mode incrémental et au mode tous circuits :
+# courses déjà traitées et historique des pilotes déjà calculé (voir add_pilot_history.py).
+# L'historique est toujours celui d'avant chaque course (jointure as-of).
+def build_features(data_root=DEFAULT_DATA_ROOT, weather_path=DEFAULT_WEATHER_PATH, race_name=RACE_NAME,
+                   radius_km=DEFAULT_RADIUS_KM, cache_dir=DEFAULT_CACHE_DIR, until='features',
+                   timer=None, materialize=False, exclude_race_ids=None, history=None, circuit_id=None):
+    timer = timer or StageTimer()
+    data_dir = os.path.join(data_root, 'data')
+
+    def stage(name, func, *args):
+        lf = timer.run(name, func, *args)
+        if materialize:
+            lf = timer.run(f'{name} (calcul)', lambda: lf.collect().lazy())
+        return lf
+
+    df_races = scan_table('races', data_root, data_dir)
+    df_results = scan_table('results', data_root, data_dir)
+    df_driver_standings = scan_table('driver_standings', data_root, data_dir)
+    if exclude_race_ids:
+        df_results = df_results.filter(~pl.col('raceId').is_in(exclude_race_ids))
+
+    lf = stage('race_results', race_results, df_races, df_results, race_name, circuit_id)
+    if until == 'race_results':
+        return lf
+
+    df_weather = timer.run('weather (source)', scan_race_weather, data_root, weather_path, race_name,
+                           radius_km, cache_dir, circuit_id)
+    lf = stage('weather', combine_weather_and_race, lf, df_weather)
+    if until == 'weather':
+        return lf
+
+    if history is not None:
+        lf = stage('pilot_history', join_driver_history, lf, history)
+    else:
+        lf = stage('pilot_history', add_pilot_history, lf, df_driver_standings, df_races,
+                   scan_table('results', data_root, data_dir))
+    if until == 'pilot_history':
+        return lf
+
+    # Temps convertis en millisecondes : écart au poleman en qualification, arrêts aux stands
+    lf = stage('timing', add_timing_features, lf, scan_table('qualifying', data_root, data_dir),
+               scan_table('pit_stops', data_root, data_dir))
+    return lf.select(OUTPUT_COLUMNS)
+
+
+# Écrire les profils des pilotes à partir de leur dernier état (calculé s'il n'est pas fourni)
+def write_driver_profiles(data_root=DEFAULT_DATA_ROOT, output_root=DEFAULT_OUTPUT_ROOT, state=None):
+    data_dir = os.path.join(data_root, 'data')
+    if state is None:
+        state = driver_state(driver_history(
+            scan_table('driver_standings', data_root, data_dir), scan_table('races', data_root, data_dir),
+            scan_table('results', data_root, data_dir),
+        ))
+    output = os.path.join(output_root, os.path.basename(DRIVER_PROFILES_PATH))
+    os.makedirs(output_root, exist_ok=True)
+    driver_profiles(state, scan_table('drivers', data_root, data_dir)).collect().write_parquet(output)
+    return output
+
+
+# Exécuter le pipeline : un seul collect optimisé, puis écriture de la table finale
+def run_pipeline(data_root=DEFAULT_DATA_ROOT, output_root=DEFAULT_OUTPUT_ROOT,
+                 weather_path=DEFAULT_WEATHER_PATH, race_name=RACE_NAME, radius_km=DEFAULT_RADIUS_KM,
+                 cache_dir=DEFAULT_CACHE_DIR, until='features', materialize=False, circuit_id=None):
+    timer = StageTimer()
+    lf = build_features(data_root, weather_path, race_name, radius_km, cache_dir, until, timer, materialize,
+                        circuit_id=circuit_id)
+    df = timer.run('collect', lf.collect)
+
+    output = stage_path(output_root, race_name, until, circuit_id)
+    os.makedirs(output_root, exist_ok=True)
+    timer.run('write', df.write_parquet, output)
+    if until == 'features':
+        timer.run('driver_profiles', write_driver_profiles, data_root, output_root)
+
+    print(df.head())
+    print(f'{df.height} lignes écrites dans {output}')
+    timer.report()
+    return df
+
+
+# Mode incrémental : seules les courses absentes du manifeste sont transformées,
+# les agrégats des pilotes sont mis à jour avec les nouvelles lignes de driver_standings
+# et les nouvelles features sont ajoutées au magasin partitionné. Une course sans observation
+# météo n'est pas marquée comme traitée : elle est reprise quand la source météo change
+# (le magasin est alors reconstruit, les features de toutes les courses en dépendant).
+def run_incremental(data_root=DEFAULT_DATA_ROOT, output_root=DEFAULT_OUTPUT_ROOT,
+                    weather_path=DEFAULT_WEATHER_PATH, race_name=RACE_NAME, radius_km=DEFAULT_RADIUS_KM,
+                    cache_dir=DEFAULT_CACHE_DIR, circuit_id=None):
+    timer = StageTimer()
+    data_dir = os.path.join(data_root, 'data')
+    store = store_dir(output_root, race_name, circuit_id)
+    manifest = read_manifest(store)
+
+    weather = timer.run('manifest (météo)', weather_fingerprint, weather_path, radius_km, manifest.get('weather'))
+    if not same_weather(weather, manifest.get('weather')) and (manifest['history_race_ids'] or manifest['parts']):
+        print(f'Source météo modifiée : magasin {store} reconstruit')
+        manifest = reset_store(store)
+
+    # Nouvelles courses : lignes de standings pas encore intégrées, courses du GP sans features
+    # (hors courses déjà examinées sans météo avec la même source)
+    done_race_ids = manifest['feature_race_ids'] + manifest.get('race_ids_without_weather', [])
+    df_new_standings = scan_table('driver_standings', data_root, data_dir).filter(
+        ~pl.col('raceId').is_in(manifest['history_race_ids'])
+    )
+    new_history_race_ids = timer.run(
+        'manifest', lambda: df_new_standings.select(pl.col('raceId').unique()).collect()['raceId'].to_list()
+    )
+    new_feature_race_ids = timer.run('manifest (GP)', lambda: (
+        race_results(scan_table('races', data_root, data_dir), scan_table('results', data_root, data_dir),
+                     race_name, circuit_id)
+        .filter(~pl.col('raceId').is_in(done_race_ids))
+        .select(pl.col('raceId').unique())
+        .collect()['raceId'].to_list()
+    ))
+    if not new_history_race_ids and not new_feature_race_ids:
+        print(f'Magasin {store} déjà à jour')
+        timer.report()
+        return None
+
+    # Historique des pilotes : prolonger le dernier état connu avec les nouvelles lignes uniquement
+    # (les nouvelles courses sont supposées postérieures à celles déjà intégrées)
+    history = timer.run('pilot_history (état)', lambda: driver_history(
+        df_new_standings, scan_table('races', data_root, data_dir), scan_table('results', data_root, data_dir),
+        load_driver_state(store),
+    ).collect())
+    state = timer.run('pilot_history (dernier état)', lambda: driver_state(history).collect())
+
+    lf = build_features(data_root, weather_path, race_name, radius_km, cache_dir, timer=timer,
+                        exclude_race_ids=done_race_ids, history=history, circuit_id=circuit_id)
+    df = timer.run('collect', lf.collect)
+    race_ids_without_weather = sorted(set(new_feature_race_ids) - set(df['raceId'].unique().to_list()))
+    parts = timer.run('append', append_features, store, df, state, manifest, new_history_race_ids,
+                      race_ids_without_weather, weather)
+    timer.run('driver_profiles', write_driver_profiles, data_root, output_root, state)
+
+    print(f'{df["raceId"].n_unique()} nouvelle(s) course(s), {df.height} lignes ajoutées '
+          f'dans {len(parts)} partition(s) de {store}'
+          + (f', {len(race_ids_without_weather)} course(s) sans météo' if race_ids_without_weather else ''))
+    timer.report()
+    return df
+
+
+# Tâche d'un processus du pool : construire les features d'un circuit
+def _build_circuit(circuit_id, data_root, weather_path, radius_km, cache_dir, history):
+    start = time.perf_counter()
+    df = build_features(data_root, weather_path, radius_km=radius_km, cache_dir=cache_dir,
+                        history=history, circuit_id=circuit_id).collect()
+    return circuit_id, df, time.perf_counter() - start
+
+
+# Construire les features de tous les circuits de circuits.csv en parallèle.
+# Les tables sont converties une seule fois en Arrow IPC : chaque processus les mappe en
+# mémoire (une seule copie partagée via le cache disque), l'index / le cache météo sont
+# préparés avant le lancement et l'historique des pilotes est calculé une seule fois.
+def run_all_circuits(data_root=DEFAULT_DATA_ROOT, output_root=DEFAULT_OUTPUT_ROOT,
+                     weather_path=DEFAULT_WEATHER_PATH, radius_km=DEFAULT_RADIUS_KM,
+                     cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    timer = StageTimer()
+    data_dir = os.path.join(data_root, 'data')
+    workers = workers or os.cpu_count() or 1
+
+    timer.run('ingest', ingest_tables, ['circuits', 'races', 'results', 'driver_standings'], data_root, data_dir)
+    if not cache_is_fresh(weather_path, cache_dir, radius_km):
+        timer.run('weather (index)', ensure_weather_index, weather_path)
+    history = timer.run('pilot_history', lambda: driver_history(
+        scan_table('driver_standings', data_root, data_dir), scan_table('races', data_root, data_dir),
+        scan_table('results', data_root, data_dir),
+    ).collect())
+    circuit_ids = scan_table('circuits', data_root, data_dir).select('circuitId').collect()['circuitId'].to_list()
+
+    frames = []
+    start = time.perf_counter()
+    if workers == 1:
+        for circuit_id in circuit_ids:
+            frames.append(_build_circuit(circuit_id, data_root, weather_path, radius_km, cache_dir, history))
+    else:
+        # Répartir les threads Polars entre les processus pour ne pas surcharger les cœurs
+        previous = os.environ.get('POLARS_MAX_THREADS')
+        os.environ['POLARS_MAX_THREADS'] = str(max(1, (os.cpu_count() or 1) // workers))
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(_build_circuit, circuit_id, data_root, weather_path, radius_km, cache_dir, history)
+                    for circuit_id in circuit_ids
+                ]
+                frames = [future.result() for future in as_completed(futures)]
+        finally:
+            if previous is None:
+                os.environ.pop('POLARS_MAX_THREADS', None)
+            else:
+                os.environ['POLARS_MAX_THREADS'] = previous
+    timer.timings.append((f'circuits ({len(circuit_ids)}, {workers} processus)', time.perf_counter() - start))
+
+    for circuit_id, df_circuit, seconds in sorted(frames, key=lambda frame: frame[0]):
+        print(f'  circuit {circuit_id}: {df_circuit.height} lignes en {seconds * 1000:.1f} ms')
+
+    df = pl.concat([frame[1] for frame in frames]).sort('circuitId', 'raceId', 'driverId')
+    output = os.path.join(output_root, ALL_CIRCUITS_FILE)
+    os.makedirs(output_root, exist_ok=True)
+    timer.run('write', df.write_parquet, output)
+    timer.run('driver_profiles', write_driver_profiles, data_root, output_root, driver_state(history))
+
+    print(f'{df.height} lignes ({len(circuit_ids)} circuits) écrites dans {output}')
+    timer.report()
+    return df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Construire la table de features pour le modèle de prédiction')
+    parser.add_argument('--data-root', default=DEFAULT_DATA_ROOT, help='Dossier des CSV Ergast (et du magasin Arrow data/)')
+    parser.add_argument('--output-root', default=DEFAULT_OUTPUT_ROOT, help='Dossier de sortie')
+    parser.add_argument('--weather', default=DEFAULT_WEATHER_PATH, help='Fichier Parquet météo')
+    parser.add_argument('--weather-cache', default=DEFAULT_CACHE_DIR, help='Dossier du cache météo par circuit')
+    parser.add_argument('--race-name', default=RACE_NAME, help='Nom du Grand Prix')
+    parser.add_argument('--circuit-id', type=int, help='Construire les features d\'un circuit (remplace --race-name)')
+    parser.add_argument('--all-circuits', action='store_true', help='Construire les features de tous les circuits')
+    parser.add_argument('--workers', type=int, help='Nombre de processus pour --all-circuits (tous les cœurs par défaut)')
+    parser.add_argument('--radius-km', type=float, default=DEFAULT_RADIUS_KM, help='Rayon météo autour du circuit (km)')
+    parser.add_argument('--until', choices=STAGES, default='features', help="S'arrêter après cette étape")
+    parser.add_argument('--stage-timings', action='store_true',
+                        help='Calculer chaque étape séparément pour mesurer son coût (plus lent)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Traiter uniquement les nouvelles courses et les ajouter au magasin partitionné')
+    return parser.parse_args(argv)
+
+
+def main(argv=None, until=None):
+    args = parse_args(argv)
+    if args.all_circuits:
+        return run_all_circuits(
+            args.data_root, args.output_root, args.weather, args.radius_km, args.weather_cache, args.workers,
+        )
+    if args.incremental:
+        return run_incremental(
+            args.data_root, args.output_root, args.weather, args.race_name, args.radius_km, args.weather_cache,
+            args.circuit_id,
+        )
+    return run_pipeline(
+        args.data_root, args.output_root, args.weather, args.race_name, args.radius_km,
+        args.weather_cache, until or args.until, args.stage_timings, args.circuit_id,
+    )
+
+
+if __name__ == '__main__':
+    main()
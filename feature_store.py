@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import time
+
+import polars as pl
+
+from add_pilot_history import STATE_SCHEMA
+from data_provider import file_sha256
+
+MANIFEST_FILE = 'manifest.json'
+STATE_FILE = 'driver_state.parquet'
+PARTS_DIR = 'parts'
+
+
+def _empty_manifest():
+    return {'feature_race_ids': [], 'history_race_ids': [], 'race_ids_without_weather': [], 'parts': [],
+            'weather': None}
+
+
+# Manifeste du magasin : courses déjà transformées en features, courses déjà intégrées
+# dans l'historique des pilotes, courses sans observation météo dans la source actuelle
+# (retentées quand elle change), liste des partitions écrites et empreinte de la source météo
+def read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return _empty_manifest()
+
+
+# Empreinte de la source météo et rayon utilisé : les features en dépendent. Comme pour le
+# cache météo, le SHA-256 n'est recalculé que si la taille ou la date du fichier a changé.
+def weather_fingerprint(weather_path, radius_km, previous=None):
+    stat = os.stat(weather_path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime, 'radius_km': radius_km}
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime:
+        fingerprint['sha256'] = previous.get('sha256')
+    else:
+        fingerprint['sha256'] = file_sha256(weather_path)
+    return fingerprint
+
+
+def same_weather(fingerprint, other):
+    return (fingerprint is not None and other is not None
+            and (fingerprint['sha256'], fingerprint['radius_km']) == (other['sha256'], other['radius_km']))
+
+
+# Vider le magasin (source météo modifiée) : tout est reconstruit à la prochaine exécution
+def reset_store(store_dir):
+    if os.path.isdir(store_dir):
+        shutil.rmtree(store_dir)
+    return _empty_manifest()
+
+
+def load_driver_state(store_dir):
+    path = os.path.join(store_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    return pl.read_parquet(path).cast(STATE_SCHEMA)
+
+
+def _replace_atomically(path, write):
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Ajouter les nouvelles lignes au magasin, partitionnées par année. Seules les courses présentes
+# dans df_features sont marquées comme traitées ; les autres courses examinées (sans météo)
+# sont notées à part. Le manifeste est écrit en dernier : une exécution interrompue sera refaite.
+def append_features(store_dir, df_features, df_state, manifest, new_history_race_ids,
+                    race_ids_without_weather=(), weather=None):
+    os.makedirs(store_dir, exist_ok=True)
+    run_id = time.strftime('%Y%m%dT%H%M%S')
+
+    parts = []
+    if df_features.height > 0:
+        for (year,), df_year in df_features.partition_by('year', as_dict=True).items():
+            part = os.path.join(PARTS_DIR, f'year={year}', f'part-{run_id}.parquet')
+            os.makedirs(os.path.join(store_dir, os.path.dirname(part)), exist_ok=True)
+            _replace_atomically(os.path.join(store_dir, part), df_year.write_parquet)
+            parts.append(part)
+
+    _replace_atomically(os.path.join(store_dir, STATE_FILE), df_state.write_parquet)
+
+    feature_race_ids = set(manifest['feature_race_ids']) | set(df_features['raceId'].unique().to_list())
+    manifest = {
+        'feature_race_ids': sorted(feature_race_ids),
+        'history_race_ids': sorted(set(manifest['history_race_ids']) | set(new_history_race_ids)),
+        'race_ids_without_weather': sorted(
+            (set(manifest.get('race_ids_without_weather', [])) | set(race_ids_without_weather)) - feature_race_ids
+        ),
+        'parts': manifest['parts'] + parts,
+        'weather': weather,
+    }
+
+    def write_manifest(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    _replace_atomically(os.path.join(store_dir, MANIFEST_FILE), write_manifest)
+    return parts
+
+
+# Lire une table de features : fichier Parquet unique ou magasin partitionné.
+# Le schéma est celui de la partition la plus récente : les colonnes ajoutées depuis
+# l'écriture des anciennes partitions y sont lues comme nulles.
+def scan_features(path):
+    if os.path.isdir(path):
+        parts = [os.path.join(path, part) for part in read_manifest(path)['parts']]
+        schema = pl.read_parquet_schema(parts[-1]) if parts else None
+        return pl.scan_parquet(parts, schema=schema, missing_columns='insert', hive_partitioning=False)
+    return pl.scan_parquet(path)
@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+
+META_FILE = 'forest.json'
+
+# Tableaux du modèle aplati : un fichier .npy par tableau, lisible par np.load(mmap_mode='r')
+ARRAYS = ('feature', 'threshold', 'children', 'missing_left', 'value', 'roots')
+
+
+# Dossier du modèle aplati, enregistré à côté du modèle picklé (model.pkl → model.forest/)
+def forest_dir(model_path):
+    return os.path.splitext(model_path)[0] + '.forest'
+
+
+# Aplatir une forêt scikit-learn (régression, une sortie) en tableaux NumPy contigus :
+# tous les nœuds de tous les arbres bout à bout, enfants en indices globaux rangés par paire
+# (children[2 * nœud] = droite, children[2 * nœud + 1] = gauche : l'enfant suivant est lu
+# en un seul accès avec le résultat de la comparaison).
+# Les feuilles pointent sur elles-mêmes : le parcours peut faire max_depth pas sans test.
+# missing_left indique de quel côté partent les valeurs manquantes (NaN), comme dans scikit-learn.
+def flatten_forest(model):
+    features, thresholds, children, missing_lefts, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count, dtype=np.int32)
+        is_leaf = tree.children_left == -1
+
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        left = np.where(is_leaf, nodes, tree.children_left) + offset
+        right = np.where(is_leaf, nodes, tree.children_right) + offset
+        children.append(np.column_stack([right, left]).ravel().astype(np.int32))
+        missing_lefts.append(np.asarray(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count)), dtype=bool))
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'children': np.concatenate(children),
+        'missing_left': np.concatenate(missing_lefts),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.int32),
+    }
+    feature_names = [str(name) for name in getattr(model, 'feature_names_in_', [])]
+    meta = {'n_trees': len(roots), 'n_nodes': offset, 'max_depth': int(max_depth),
+            'n_features': int(model.n_features_in_), 'feature_names': feature_names}
+    return arrays, meta
+
+
+# Le modèle aplati est à jour s'il a été exporté après la dernière écriture du modèle picklé
+# (le fichier de métadonnées est écrit en dernier)
+def forest_is_fresh(model_path):
+    meta_path = os.path.join(forest_dir(model_path), META_FILE)
+    if not os.path.exists(meta_path):
+        return False
+    return not os.path.exists(model_path) or os.path.getmtime(meta_path) >= os.path.getmtime(model_path)
+
+
+def export_forest(model, path):
+    arrays, meta = flatten_forest(model)
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+    with open(os.path.join(path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return path
+
+
+# Évaluateur vectorisé : toutes les lignes descendent tous les arbres en même temps,
+# un pas de profondeur par itération (aucune boucle Python par ligne ni par arbre)
+class FlatForest:
+    def __init__(self, arrays, meta):
+        # np.asarray : vue sans copie des tableaux mappés (évite le surcoût de np.memmap)
+        for name in ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]))
+        self.meta = meta
+        self.n_features_in_ = meta['n_features']
+
+    # Prédictions de chaque arbre, tableau (n_lignes, n_arbres)
+    def predict_trees(self, X):
+        # Même conversion que scikit-learn : les features sont comparées en float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        has_missing = np.isnan(X).any()
+        # Indices à plat dans X : ligne * n_features + feature du nœud
+        row_offsets = (np.arange(X.shape[0]) * X.shape[1])[:, None]
+        X = X.ravel()
+        nodes = np.broadcast_to(self.roots, (row_offsets.shape[0], self.roots.shape[0]))
+        for _ in range(self.meta['max_depth']):
+            x = X.take(row_offsets + self.feature.take(nodes))
+            go_left = x <= self.threshold.take(nodes)
+            if has_missing:
+                go_left |= np.isnan(x) & self.missing_left.take(nodes)
+            next_nodes = self.children.take(2 * nodes + go_left)
+            # Arrêt anticipé : toutes les lignes sont arrivées sur une feuille
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return self.value.take(nodes)
+
+    def predict(self, X):
+        return self.predict_trees(X).mean(axis=1)
+
+
+# Charger le modèle aplati : les tableaux sont mappés en mémoire (chargement quasi immédiat)
+def load_forest(path, mmap_mode='r'):
+    with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+    return FlatForest(arrays, meta)
+
+
+# Écart maximal entre les prédictions de scikit-learn et celles du modèle aplati
+def max_prediction_error(model, forest, X):
+    return float(np.max(np.abs(model.predict(X) - forest.predict(X)))) if len(X) else 0.0
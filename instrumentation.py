@@ -0,0 +1,256 @@
+import atexit
+import functools
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure de la mémoire
+    resource = None
+
+# Dossier où écrire la trace JSON et le fichier Prometheus à la fin d'un script
+# (rien n'est écrit si la variable n'est pas définie)
+TRACE_DIR_ENV = 'F1_TRACE_DIR'
+TRACE_FILE = 'trace.json'
+METRICS_FILE = 'metrics.prom'
+
+# Nombre de spans conservés en mémoire (les agrégats Prometheus couvrent tous les spans)
+MAX_SPANS = 10_000
+
+METRIC_PREFIX = 'f1'
+
+_PAGE_SIZE = resource.getpagesize() if resource is not None else 4096
+
+
+# Mémoire résidente actuelle du processus (Mo) : /proc sous Linux, pic (ru_maxrss) ailleurs
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm', encoding='ascii') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 1024 / 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en kilo-octets sous Linux, en octets sous macOS
+    return maxrss / 1024 / 1024 if maxrss > 1 << 32 else maxrss / 1024
+
+
+# Un span : étape nommée, durée, mémoire au début et à la fin, attributs libres
+# (cache='hit' / 'miss', circuit...), span parent dans le même thread
+class Span:
+    __slots__ = ('seq', 'name', 'attrs', 'parent', 'thread', 'start', 'duration', 'rss_start', 'rss_end',
+                 'children', 'error')
+
+    def __init__(self, seq, name, attrs, parent, thread):
+        self.seq = seq
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.thread = thread
+        self.start = time.time()
+        self.duration = None
+        self.rss_start = current_rss_mb()
+        self.rss_end = None
+        self.children = 0
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def to_dict(self):
+        return {
+            'seq': self.seq, 'name': self.name, 'parent': self.parent, 'thread': self.thread,
+            'start': self.start, 'duration_ms': None if self.duration is None else self.duration * 1000,
+            'rss_start_mb': self.rss_start, 'rss_end_mb': self.rss_end,
+            'rss_delta_mb': None if self.rss_end is None or self.rss_start is None else self.rss_end - self.rss_start,
+            'error': self.error, **self.attrs,
+        }
+
+
+# Collecteur de spans, partagé par tous les threads du processus (donc par toutes les sessions
+# Streamlit) : les derniers spans sont gardés pour la trace, les agrégats par nom pour Prometheus
+class Tracer:
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._seq = itertools.count(1)
+        self.origin = time.time()
+        # nom → [nombre, durée totale (s), durée max (s), erreurs]
+        self.totals = {}
+        # (nom, résultat) → nombre d'accès au cache
+        self.cache_counts = {}
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    # Span autour d'un bloc. cached=True : appel à une fonction mise en cache dont le calcul
+    # ouvre ses propres spans ; sans span enfant, l'appel est compté comme un accès au cache
+    @contextmanager
+    def span(self, name, cached=False, **attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        span = Span(next(self._seq), name, attrs, parent.seq if parent else None, threading.get_ident())
+        if parent is not None:
+            parent.children += 1
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            span.rss_end = current_rss_mb()
+            stack.pop()
+            if cached and 'cache' not in span.attrs:
+                span.attrs['cache'] = 'miss' if span.children else 'hit'
+            self._record(span)
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            total = self.totals.setdefault(span.name, [0, 0.0, 0.0, 0])
+            total[0] += 1
+            total[1] += span.duration
+            total[2] = max(total[2], span.duration)
+            total[3] += span.error is not None
+            if 'cache' in span.attrs:
+                key = (span.name, span.attrs['cache'])
+                self.cache_counts[key] = self.cache_counts.get(key, 0) + 1
+
+    # Numéro du dernier span ouvert : les spans suivants sont ceux d'une exécution (rerun)
+    def mark(self):
+        return next(self._seq)
+
+    # Spans terminés depuis mark(), du thread courant seulement par défaut
+    def spans_since(self, mark, current_thread=True):
+        thread = threading.get_ident()
+        with self._lock:
+            spans = [s for s in self.spans if s.seq > mark and (not current_thread or s.thread == thread)]
+        return sorted(spans, key=lambda s: s.seq)
+
+    # Trace au format Chrome / Perfetto (chrome://tracing, ui.perfetto.dev) : un événement
+    # complet ('X') par span, temps en microsecondes depuis le démarrage du collecteur
+    def trace(self, spans=None):
+        with self._lock:
+            spans = list(self.spans) if spans is None else spans
+        events = []
+        for span in sorted(spans, key=lambda s: s.start):
+            args = {k: v for k, v in span.to_dict().items() if k not in ('name', 'start', 'duration_ms', 'thread')}
+            events.append({
+                'name': span.name, 'ph': 'X', 'pid': os.getpid(), 'tid': span.thread,
+                'ts': (span.start - self.origin) * 1e6, 'dur': span.duration * 1e6, 'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    # Agrégats au format texte de Prometheus (fichier lu par le collecteur textfile de node_exporter)
+    def prometheus(self):
+        with self._lock:
+            totals = {name: list(values) for name, values in self.totals.items()}
+            cache_counts = dict(self.cache_counts)
+        lines = [
+            f'# HELP {METRIC_PREFIX}_span_duration_seconds Durée des étapes instrumentées',
+            f'# TYPE {METRIC_PREFIX}_span_duration_seconds summary',
+        ]
+        for name, (count, total, _, _) in sorted(totals.items()):
+            lines.append(f'{METRIC_PREFIX}_span_duration_seconds_count{{span="{_label(name)}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_span_duration_seconds_sum{{span="{_label(name)}"}} {total:.6f}')
+        lines += [
+            f'# HELP {METRIC_PREFIX}_span_duration_max_seconds Durée maximale observée par étape',
+            f'# TYPE {METRIC_PREFIX}_span_duration_max_seconds gauge',
+        ]
+        lines += [f'{METRIC_PREFIX}_span_duration_max_seconds{{span="{_label(name)}"}} {values[2]:.6f}'
+                  for name, values in sorted(totals.items())]
+        lines += [
+            f'# HELP {METRIC_PREFIX}_span_errors_total Étapes terminées par une exception',
+            f'# TYPE {METRIC_PREFIX}_span_errors_total counter',
+        ]
+        lines += [f'{METRIC_PREFIX}_span_errors_total{{span="{_label(name)}"}} {values[3]}'
+                  for name, values in sorted(totals.items())]
+        lines += [
+            f'# HELP {METRIC_PREFIX}_cache_requests_total Accès aux caches par résultat (hit / miss)',
+            f'# TYPE {METRIC_PREFIX}_cache_requests_total counter',
+        ]
+        lines += [f'{METRIC_PREFIX}_cache_requests_total{{span="{_label(name)}",result="{_label(result)}"}} {count}'
+                  for (name, result), count in sorted(cache_counts.items())]
+        rss = current_rss_mb()
+        if rss is not None:
+            lines += [
+                f'# HELP {METRIC_PREFIX}_process_resident_memory_bytes Mémoire résidente du processus',
+                f'# TYPE {METRIC_PREFIX}_process_resident_memory_bytes gauge',
+                f'{METRIC_PREFIX}_process_resident_memory_bytes {int(rss * 1024 * 1024)}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        trace_path = os.path.join(directory, TRACE_FILE)
+        metrics_path = os.path.join(directory, METRICS_FILE)
+        _write_atomic(trace_path, json.dumps(self.trace()))
+        _write_atomic(metrics_path, self.prometheus())
+        return trace_path, metrics_path
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.totals.clear()
+            self.cache_counts.clear()
+
+
+def _label(value):
+    return re.sub(r'(["\\])', r'\\\1', str(value)).replace('\n', '\\n')
+
+
+# Écriture puis renommage : le collecteur Prometheus ne lit jamais un fichier à moitié écrit
+def _write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Collecteur du processus
+tracer = Tracer()
+
+
+def span(name, cached=False, **attrs):
+    return tracer.span(name, cached, **attrs)
+
+
+# Décorateur : un span à chaque appel de la fonction
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Tableau des spans (un dictionnaire par span, triés par ordre d'ouverture)
+def span_rows(spans):
+    return [span.to_dict() for span in spans]
+
+
+# Écrire la trace et les métriques dans F1_TRACE_DIR (si défini) à la fin du processus
+def write_from_env():
+    directory = os.environ.get(TRACE_DIR_ENV)
+    if directory and tracer.totals:
+        return tracer.write(directory)
+    return None
+
+
+atexit.register(write_from_env)
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+
+# Taille en mémoire (octets) d'une valeur mise en cache : DataFrame Polars / pandas,
+# table Arrow, octets ou dictionnaire de ces valeurs
+def estimate_nbytes(value):
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v) for v in value.values())
+    if hasattr(value, 'estimated_size'):  # Polars
+        return value.estimated_size()
+    if hasattr(value, 'memory_usage'):  # pandas
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'nbytes'):  # Arrow / NumPy
+        return value.nbytes
+    return 0
+
+
+# Cache LRU partagé par tous les threads (et donc toutes les sessions Streamlit) du processus,
+# limité par un budget en octets : les entrées les moins récemment utilisées sont évincées.
+# Les valeurs sont partagées telles quelles (sans copie) et doivent être traitées en lecture seule.
+class ByteBudgetLRU:
+    def __init__(self, max_bytes, sizeof=estimate_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        nbytes = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            # Une valeur plus grande que tout le budget n'est pas conservée
+            if nbytes > self.max_bytes:
+                return value
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+        return value
+
+    # Lire la valeur ou la calculer avec load() (hors verrou : un chargement lent ne bloque
+    # pas les autres sessions, deux chargements simultanés de la même clé restent corrects)
+    def get_or_load(self, key, load):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self.put(key, load())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
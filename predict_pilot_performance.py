@@ -1,36 +1,114 @@
+import os
+
+import numpy as np
 import polars as pl
-import pandas as pd
-import joblib
-
-# Charger les fichiers pilotes et standings
-df_drivers = pl.read_csv('C:/Users/mazgo/Downloads/csv/drivers.csv')
-df_driver_standings = pl.read_csv('C:/Users/mazgo/Downloads/csv/driver_standings.csv')
-
-# Fonction pour sélectionner un pilote par son nom
-def choisir_pilote(nom_pilote):
-    # Filtrer le pilote choisi par son nom
-    pilote = df_drivers.filter(pl.col('surname') == nom_pilote).to_pandas()
-    if pilote.empty:
-        print("Pilote non trouvé")
-        return None
-    return pilote.iloc[0]
-
-# Exemple : Choisir un pilote
-pilote_choisi = choisir_pilote('Verstappen')  # Remplace par le nom du pilote que tu veux
-
-if pilote_choisi is not None:
-    driver_id = pilote_choisi['driverId']
-    
-    # Obtenir l'historique du pilote à partir du driver_standings.csv
-    pilote_historique = df_driver_standings.filter(pl.col('driverId') == driver_id)
-    
-    # Calculer des statistiques pour le pilote choisi
-    total_wins = pilote_historique['wins'].sum()
-    total_points = pilote_historique['points'].sum()
-    average_position = pilote_historique['position'].mean()
-    
-    print(f"Pilote: {pilote_choisi['surname']}, Total Wins: {total_wins}, Total Points: {total_points}, Average Position: {average_position}")
-    
+from feature_pipeline import DEFAULT_MODEL_PATH, DRIVER_PROFILES_PATH, FEATURE_COLUMNS
+from forest_export import forest_dir, forest_is_fresh, load_forest
+from data_store import load_table
+from add_pilot_history import HISTORY_FEATURES, driver_history, driver_profiles, driver_state
+
+# Colonnes météo attendues par le modèle
+WEATHER_FEATURES = ['climate_temperature', 'gfs_wind_speed', 'gfs_humidity']
+
+
+# Charger le modèle de prédiction : la forêt aplatie (tableaux mappés en mémoire) si elle a été
+# exportée après le dernier entraînement, sinon le modèle picklé
+def load_prediction_model(model_path=DEFAULT_MODEL_PATH):
+    if forest_is_fresh(model_path):
+        return load_forest(forest_dir(model_path))
+    import joblib
+    return joblib.load(model_path)
+
+
+# Charger les profils précalculés des pilotes (une ligne par pilote), ou les calculer
+# à partir des tables si feature_pipeline.py n'a pas encore été exécuté
+def load_driver_profiles(path=DRIVER_PROFILES_PATH):
+    if os.path.exists(path):
+        return pl.read_parquet(path)
+    state = driver_state(driver_history(load_table('driver_standings'), load_table('races'), load_table('results')))
+    return driver_profiles(state, load_table('drivers')).collect()
+
+
+# Sélectionner les profils des pilotes demandés (noms de famille ou driverId), dans l'ordre demandé
+def select_drivers(profiles, drivers):
+    key = 'surname' if all(isinstance(driver, str) for driver in drivers) else 'driverId'
+    # Homonymes : garder le premier pilote, comme la recherche par nom d'origine
+    profiles = profiles.unique(key, keep='first', maintain_order=True)
+    selected = pl.DataFrame({key: list(drivers)}, schema={key: profiles.schema[key]}).join(
+        profiles, on=key, how='left', maintain_order='left'
+    )
+    missing = selected.filter(pl.col('total_wins').is_null())[key].to_list()
+    if missing:
+        raise KeyError(f'Pilote(s) non trouvé(s) : {missing}')
+    return selected
+
+
+# Conditions météo : liste de dictionnaires (scénarios explicites) ou dictionnaire de listes
+# (grille : produit cartésien de toutes les valeurs)
+def weather_matrix(weather):
+    if isinstance(weather, dict):
+        values = [np.asarray(weather[column], dtype=np.float64) for column in WEATHER_FEATURES]
+        mesh = np.meshgrid(*values, indexing='ij')
+        return np.column_stack([axis.ravel() for axis in mesh])
+    return np.array([[condition[column] for column in WEATHER_FEATURES] for condition in weather], dtype=np.float64)
+
+
+# Construire toute la matrice de features (pilotes × positions de départ × météo) en une fois
+def build_feature_matrix(history, grid_positions, weather):
+    n_drivers, n_grid, n_weather = history.shape[0], len(grid_positions), weather.shape[0]
+    n_rows = n_drivers * n_grid * n_weather
+
+    X = np.empty((n_rows, len(FEATURE_COLUMNS)), dtype=np.float64)
+    driver_index = np.repeat(np.arange(n_drivers), n_grid * n_weather)
+    for j, column in enumerate(WEATHER_FEATURES):
+        X[:, FEATURE_COLUMNS.index(column)] = np.tile(weather[:, j], n_drivers * n_grid)
+    X[:, FEATURE_COLUMNS.index('grid')] = np.tile(np.repeat(np.asarray(grid_positions, dtype=np.float64), n_weather), n_drivers)
+    for j, column in enumerate(HISTORY_FEATURES):
+        X[:, FEATURE_COLUMNS.index(column)] = history[driver_index, j]
+    return X, driver_index
+
+
+# Prédire une matrice de features avec un seul appel au modèle
+def predict_matrix(model, X):
+    if hasattr(model, 'feature_names_in_'):
+        # Le modèle a été entraîné sur un DataFrame : garder les noms de colonnes (sans copie)
+        import pandas as pd
+        X = pd.DataFrame(X, columns=FEATURE_COLUMNS, copy=False)
+    return model.predict(X)
+
+
+# API de prédiction par lots : tous les scénarios pilotes × positions de départ × météo
+# sont construits en une seule matrice NumPy et prédits en un seul appel
+def predict_scenarios(model, drivers, grid_positions, weather, profiles=None):
+    # pandas n'est importé que pour le tableau de résultats (pas par le serveur de prédiction)
+    import pandas as pd
+
+    profiles = load_driver_profiles() if profiles is None else profiles
+    selected = select_drivers(profiles, drivers)
+    weather = weather_matrix(weather)
+
+    X, driver_index = build_feature_matrix(selected.select(HISTORY_FEATURES).to_numpy().astype(np.float64),
+                                           grid_positions, weather)
+    predictions = predict_matrix(model, X)
+
+    result = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+    result.insert(0, 'driverId', selected['driverId'].to_numpy()[driver_index])
+    result.insert(1, 'surname', selected['surname'].to_numpy()[driver_index])
+    result['predicted_position'] = predictions
+    return result
+
+
+if __name__ == '__main__':
+    # Charger le modèle de prédiction (forêt aplatie ou modèle picklé)
+    model = load_prediction_model()
+    profiles = load_driver_profiles()
+
+    # Exemple : Choisir un pilote
+    pilote = select_drivers(profiles, ['Verstappen'])  # Remplace par le nom du pilote que tu veux
+    print(f"Pilote: {pilote['surname'][0]}, Total Wins: {pilote['total_wins'][0]}, "
+          f"Total Points: {pilote['total_points'][0]}, Total Podiums: {pilote['total_podiums'][0]}, "
+          f"Average Position: {pilote['average_position'][0]}")
+
     # Test avec différentes conditions météo
     weather_conditions = [
         {'climate_temperature': 30, 'gfs_wind_speed': 4.2, 'gfs_humidity': 80},   # Condition 1
@@ -38,22 +116,19 @@ if pilote_choisi is not None:
         {'climate_temperature': 40, 'gfs_wind_speed': 10.5, 'gfs_humidity': 60},   # Condition 3
         {'climate_temperature': 25, 'gfs_wind_speed': 5.0, 'gfs_humidity': 70},    # Condition 4
     ]
-    
-    # Charger le modèle de prédiction (RandomForest ou XGBoost)
-    model = joblib.load('C:/Users/mazgo/Downloads/f1_prediction_model_with_pilot_history.pkl')  # ou avec XGBoost si tu as entraîné ce modèle
-    
-    # Tester différentes conditions météorologiques
-    for i, weather in enumerate(weather_conditions):
-        # Créer un DataFrame avec les conditions météo pour la prédiction
-        X_new = pd.DataFrame([weather], columns=['climate_temperature', 'gfs_wind_speed', 'gfs_humidity'])
-
-        # Ajouter la position de départ et l'historique du pilote pour la prédiction
-        starting_position_pilote = 5  # Exemple de position de départ
-        X_new['grid'] = starting_position_pilote
-        X_new['total_wins'] = total_wins
-        X_new['total_points'] = total_points
-        X_new['average_position'] = average_position
-
-        # Faire la prédiction avec le modèle chargé
-        future_result = model.predict(X_new)
-        print(f"Condition Météo {i + 1}: {weather}, Prédiction de la position finale: {future_result}")
+
+    # Tester toutes les conditions météorologiques en un seul appel au modèle
+    starting_position_pilote = 5  # Exemple de position de départ
+    result = predict_scenarios(model, ['Verstappen'], [starting_position_pilote], weather_conditions, profiles)
+    for i, (weather, prediction) in enumerate(zip(weather_conditions, result['predicted_position'])):
+        print(f"Condition Météo {i + 1}: {weather}, Prédiction de la position finale: {prediction}")
+
+    # Grille complète : tous les pilotes × toutes les positions de départ × une grille météo
+    weather_grid = {
+        'climate_temperature': np.linspace(15, 40, 6),
+        'gfs_wind_speed': np.linspace(0, 30, 6),
+        'gfs_humidity': np.linspace(30, 100, 8),
+    }
+    grid = predict_scenarios(model, profiles['surname'].drop_nulls().to_list(), range(1, 21), weather_grid, profiles)
+    print(f'{len(grid)} scénarios prédits')
+    print(grid.groupby('surname')['predicted_position'].mean().sort_values().head(10))
@@ -1,8 +1,11 @@
-import joblib
-import pandas as pd
+from instrumentation import span
+from predict_pilot_performance import load_prediction_model, predict_scenarios
+from prediction_server import remote_predictor_from_env
 
-# Charger le modèle de prédiction
-model = joblib.load('C:/Users/mazgo/Downloads/f1_prediction_model_with_pilot_history.pkl')
+# Utiliser le serveur de prédiction s'il est configuré (F1_PREDICTION_SERVER),
+# sinon charger le modèle de prédiction dans ce processus
+with span('predict.load_model'):
+    model = remote_predictor_from_env() or load_prediction_model()
 
 # Exemples de prévisions météo actuelles pour une course à Singapour
 current_weather = {
@@ -11,20 +14,12 @@ current_weather = {
     'gfs_humidity': 80  # Exemples de valeurs d'humidité
 }
 
-# Créer un DataFrame avec les noms de colonnes (features) pour la prédiction
-X_new = pd.DataFrame([current_weather], columns=['climate_temperature', 'gfs_wind_speed', 'gfs_humidity'])
-
-# Ajouter la position de départ et l'historique du pilote pour la prédiction
-starting_position_pilote = 15  # Par exemple, un pilote partant en 3ème position
-total_wins = 5  # Total de victoires du pilote
-total_points = 1500  # Total de points du pilote
-average_position = 4  # Position moyenne du pilote
-
-X_new['grid'] = starting_position_pilote
-X_new['total_wins'] = total_wins
-X_new['total_points'] = total_points
-X_new['average_position'] = average_position
+# Pilote et position de départ pour la prédiction
+# (l'historique du pilote est lu dans les profils précalculés par feature_pipeline.py)
+pilote = 'Verstappen'
+starting_position_pilote = 15  # Par exemple, un pilote partant en 15ème position
 
 # Faire la prédiction avec le modèle chargé
-future_result = model.predict(X_new)
-print(f"Prédiction de la position finale du pilote : {future_result}")
+with span('predict.scenarios'):
+    future_result = predict_scenarios(model, [pilote], [starting_position_pilote], [current_weather])
+print(f"Prédiction de la position finale du pilote : {future_result['predicted_position'].to_numpy()}")
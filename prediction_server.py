@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from feature_pipeline import DEFAULT_MODEL_PATH, FEATURE_COLUMNS
+
+# Adresse du serveur utilisée par les clients (prédicteurs, dashboard) si elle est définie
+SERVER_URL_ENV = 'F1_PREDICTION_SERVER'
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Fenêtre de regroupement des requêtes concurrentes (ms) et taille maximale d'un lot
+DEFAULT_BATCH_WINDOW_MS = 5
+DEFAULT_MAX_BATCH_ROWS = 10_000
+
+# Nombre de requêtes conservées pour le calcul des percentiles
+METRICS_WINDOW = 10_000
+
+
+# Requête en attente : lignes à prédire et résultat rempli par le thread de prédiction
+class _PendingRequest:
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Regroupe les requêtes concurrentes arrivées dans la même fenêtre de temps en un seul
+# appel à model.predict, dans un thread dédié qui garde le modèle chargé en mémoire
+class MicroBatcher:
+    def __init__(self, model, batch_window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch_rows=DEFAULT_MAX_BATCH_ROWS):
+        self.model = model
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=METRICS_WINDOW)
+        self._batch_rows = deque(maxlen=METRICS_WINDOW)
+        self._batch_requests = deque(maxlen=METRICS_WINDOW)
+        self._n_requests = 0
+        self._n_batches = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def predict(self, rows):
+        start = time.perf_counter()
+        pending = _PendingRequest(np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS)))
+        self._queue.put(pending)
+        pending.done.wait()
+
+        with self._lock:
+            self._latencies_ms.append((time.perf_counter() - start) * 1000)
+            self._n_requests += 1
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        n_rows = batch[0].rows.shape[0]
+        deadline = time.perf_counter() + self.batch_window
+        while n_rows < self.max_batch_rows:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            n_rows += pending.rows.shape[0]
+        return batch
+
+    def _run(self):
+        # Import local : predict_pilot_performance charge polars / pandas
+        from predict_pilot_performance import predict_matrix
+
+        while True:
+            batch = self._collect_batch()
+            try:
+                predictions = predict_matrix(self.model, np.vstack([pending.rows for pending in batch]))
+                offset = 0
+                for pending in batch:
+                    pending.result = predictions[offset:offset + pending.rows.shape[0]]
+                    offset += pending.rows.shape[0]
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+
+            with self._lock:
+                self._n_batches += 1
+                self._batch_rows.append(sum(pending.rows.shape[0] for pending in batch))
+                self._batch_requests.append(len(batch))
+            for pending in batch:
+                pending.done.set()
+
+    def metrics(self):
+        with self._lock:
+            latencies = np.array(self._latencies_ms)
+            batch_rows = np.array(self._batch_rows)
+            batch_requests = np.array(self._batch_requests)
+            metrics = {'requests': self._n_requests, 'batches': self._n_batches}
+        if latencies.size:
+            metrics.update({
+                'latency_p50_ms': float(np.percentile(latencies, 50)),
+                'latency_p99_ms': float(np.percentile(latencies, 99)),
+            })
+        if batch_rows.size:
+            metrics.update({
+                'batch_rows_mean': float(batch_rows.mean()),
+                'batch_rows_max': int(batch_rows.max()),
+                'batch_requests_mean': float(batch_requests.mean()),
+                'batch_requests_max': int(batch_requests.max()),
+            })
+        return metrics
+
+
+# Lignes à prédire : liste de listes (ordre de FEATURE_COLUMNS) ou liste de dictionnaires,
+# converties et contrôlées ici (une requête mal formée est une erreur 400, pas une erreur du modèle)
+def _rows_from_payload(payload):
+    if 'instances' in payload:
+        rows = [[instance[column] for column in FEATURE_COLUMNS] for instance in payload['instances']]
+    else:
+        rows = payload['rows']
+    rows = np.asarray(rows, dtype=np.float64)
+    if rows.ndim != 2 or rows.shape[1] != len(FEATURE_COLUMNS):
+        raise ValueError(f'{len(FEATURE_COLUMNS)} valeurs attendues par ligne ({", ".join(FEATURE_COLUMNS)}), '
+                         f'reçu un tableau de forme {rows.shape}')
+    return rows
+
+
+# File d'attente des connexions assez longue pour de nombreux clients simultanés
+class PredictionHTTPServer(ThreadingHTTPServer):
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def make_handler(batcher):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send_json(200, batcher.metrics())
+            elif self.path == '/health':
+                self._send_json(200, {'status': 'ok', 'features': FEATURE_COLUMNS})
+            else:
+                self._send_json(404, {'error': f'Chemin inconnu : {self.path}'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': f'Chemin inconnu : {self.path}'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rows = _rows_from_payload(payload)
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {'error': f'Requête invalide : {e}'})
+                return
+            try:
+                predictions = batcher.predict(rows)
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+            self._send_json(200, {'predictions': predictions.tolist()})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionHandler
+
+
+def serve(model_path=DEFAULT_MODEL_PATH, host=DEFAULT_HOST, port=DEFAULT_PORT,
+          batch_window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch_rows=DEFAULT_MAX_BATCH_ROWS):
+    from predict_pilot_performance import load_prediction_model
+
+    # Le modèle est chargé une seule fois et reste en mémoire
+    start = time.perf_counter()
+    model = load_prediction_model(model_path)
+    print(f'Modèle {model_path} chargé en {time.perf_counter() - start:.2f}s')
+
+    batcher = MicroBatcher(model, batch_window_ms, max_batch_rows)
+    server = PredictionHTTPServer((host, port), make_handler(batcher))
+    print(f'Serveur de prédiction sur http://{host}:{port} (fenêtre {batch_window_ms} ms)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# Client du serveur : même interface que le modèle (predict(X)), utilisable avec
+# predict_scenarios de predict_pilot_performance.py
+class RemotePredictor:
+    def __init__(self, url=None, timeout=10):
+        self.url = (url or os.environ.get(SERVER_URL_ENV) or f'http://{DEFAULT_HOST}:{DEFAULT_PORT}').rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(self.url + path, data=data, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def predict(self, X):
+        rows = np.asarray(X, dtype=np.float64).tolist()
+        return np.asarray(self._request('/predict', {'rows': rows})['predictions'])
+
+    def metrics(self):
+        return self._request('/metrics')
+
+
+# Client configuré par la variable d'environnement F1_PREDICTION_SERVER (None si absente)
+def remote_predictor_from_env():
+    url = os.environ.get(SERVER_URL_ENV)
+    return RemotePredictor(url) if url else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serveur local de prédiction avec regroupement des requêtes')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='Fichier du modèle entraîné')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--batch-window-ms', type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help='Durée pendant laquelle les requêtes concurrentes sont regroupées')
+    parser.add_argument('--max-batch-rows', type=int, default=DEFAULT_MAX_BATCH_ROWS)
+    args = parser.parse_args()
+
+    serve(args.model, args.host, args.port, args.batch_window_ms, args.max_batch_rows)
@@ -1,17 +1,27 @@
 import polars as pl
 
-# Charger les fichiers races et résultats
-df_races = pl.read_csv('C:/Users/mazgo/Downloads/csv/races.csv')
-df_results = pl.read_csv('C:/Users/mazgo/Downloads/csv/results.csv')
+# Grand Prix étudié par défaut
+RACE_NAME = 'Singapore Grand Prix'
 
-# Filtrer pour les courses ayant eu lieu à Singapour
-df_singapore_race = df_races.filter(pl.col('name') == 'Singapore Grand Prix')
+# Filtre des courses : par circuit (circuitId) s'il est donné, sinon par nom de Grand Prix
+def race_filter(race_name=RACE_NAME, circuit_id=None):
+    if circuit_id is not None:
+        return pl.col('circuitId') == circuit_id
+    return pl.col('name') == race_name
 
-# Joindre les résultats des courses pour Singapour avec les informations des pilotes
-df_singapore_results = df_results.join(df_singapore_race, on='raceId', how='inner')
 
-# Afficher les premières lignes pour vérifier
-print(df_singapore_results.head())
+# Joindre les résultats des courses avec les informations des courses d'un Grand Prix
+# ou d'un circuit (LazyFrames : rien n'est calculé avant le collect final du pipeline)
+def race_results(df_races, df_results, race_name=RACE_NAME, circuit_id=None):
+    # Filtrer pour les courses ayant eu lieu sur ce Grand Prix / ce circuit
+    # (l'heure de départ est renommée : results a aussi une colonne 'time', le temps de course)
+    df_gp_races = df_races.filter(race_filter(race_name, circuit_id)).rename({'time': 'race_time'})
 
-# Sauvegarder les résultats des courses pour Singapour
-df_singapore_results.write_csv('C:/Users/mazgo/Downloads/singapore_race_results.csv')
+    # Joindre les résultats des courses avec les informations des courses
+    return df_results.join(df_gp_races, on='raceId', how='inner')
+
+
+if __name__ == '__main__':
+    # Exécuter le pipeline jusqu'à cette étape et sauvegarder les résultats des courses
+    from feature_pipeline import main
+    main(until='race_results')
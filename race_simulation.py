@@ -0,0 +1,147 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from add_pilot_history import HISTORY_FEATURES
+from feature_pipeline import FEATURE_COLUMNS
+from instrumentation import span
+from predict_pilot_performance import build_feature_matrix, load_driver_profiles, select_drivers, weather_matrix
+
+# Points attribués aux 10 premiers (barème depuis 2010)
+POINTS_TABLE = np.array([25, 18, 15, 12, 10, 8, 6, 4, 2, 1], dtype=np.float64)
+
+# Écart-type minimal d'un pilote : évite un classement figé quand tous les arbres sont d'accord
+MIN_STD = 0.5
+
+# Nombre de courses simulées par bloc (mémoire bornée : bloc × nb pilotes float32)
+CHUNK_SIZE = 50_000
+
+
+# Prédiction de chaque arbre de la forêt, tableau (n_lignes, n_arbres) : forêt aplatie
+# (forest_export.py) ou RandomForest scikit-learn
+def tree_predictions(model, X):
+    if hasattr(model, 'predict_trees'):
+        return model.predict_trees(X)
+    X = np.asarray(X, dtype=np.float32)
+    return np.column_stack([estimator.predict(X) for estimator in model.estimators_])
+
+
+# Position attendue de chaque pilote (moyenne des arbres) et incertitude (dispersion des arbres)
+# pour une grille de départ complète et une condition météo
+def driver_distributions(model, drivers, grid_positions, weather, profiles=None):
+    profiles = load_driver_profiles() if profiles is None else profiles
+    selected = select_drivers(profiles, drivers)
+    history = selected.select(HISTORY_FEATURES).to_numpy().astype(np.float64)
+
+    # Une ligne par pilote : la même météo pour tous, chacun avec sa position de départ
+    X, _ = build_feature_matrix(history, [0], weather_matrix([weather]))
+    X[:, FEATURE_COLUMNS.index('grid')] = np.asarray(grid_positions, dtype=np.float64)
+    per_tree = tree_predictions(model, X)
+    return selected['surname'].to_list(), per_tree.mean(axis=1), np.maximum(per_tree.std(axis=1), MIN_STD)
+
+
+# Simuler n_sims courses d'un coup : tirages (n_sims, n_pilotes), classement par argsort,
+# puis comptage vectorisé des positions obtenues par chaque pilote
+def simulate_positions(mean, std, n_sims, seed=None):
+    rng = np.random.default_rng(seed)
+    n_drivers = mean.shape[0]
+    counts = np.zeros((n_drivers, n_drivers), dtype=np.int64)
+    ranks = np.arange(n_drivers)
+
+    for start in range(0, n_sims, CHUNK_SIZE):
+        n = min(CHUNK_SIZE, n_sims - start)
+        samples = rng.standard_normal((n, n_drivers), dtype=np.float32) * std.astype(np.float32) + mean.astype(np.float32)
+        # order[s, r] = pilote classé r-ième dans la simulation s
+        order = np.argsort(samples, axis=1)
+        counts += np.bincount((order * n_drivers + ranks).ravel(), minlength=n_drivers * n_drivers) \
+            .reshape(n_drivers, n_drivers)
+    return counts
+
+
+# Simuler plusieurs jeux de distributions (un par scénario), répartis entre plusieurs
+# processus ; chaque scénario a sa propre graine, dérivée de `seed`
+def simulate_many(distributions, n_sims, workers=None, seed=None):
+    seeds = np.random.SeedSequence(seed).spawn(len(distributions))
+    workers = min(workers or os.cpu_count() or 1, len(distributions))
+    if workers <= 1:
+        return [simulate_positions(mean, std, n_sims, s) for (mean, std), s in zip(distributions, seeds)]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(simulate_positions, mean, std, n_sims, s) for (mean, std), s in zip(distributions, seeds)]
+        return [future.result() for future in futures]
+
+
+# Probabilités par pilote à partir des comptes (pilote × position finale)
+def summarize_positions(names, counts):
+    n_sims = counts[0].sum()
+    probabilities = counts / n_sims
+    n_points = min(len(POINTS_TABLE), counts.shape[1])
+    positions = np.arange(1, counts.shape[1] + 1)
+    return pd.DataFrame({
+        'surname': names,
+        'win_prob': probabilities[:, 0],
+        'podium_prob': probabilities[:, :3].sum(axis=1),
+        'points_prob': probabilities[:, :n_points].sum(axis=1),
+        'expected_points': probabilities[:, :n_points] @ POINTS_TABLE[:n_points],
+        'expected_position': probabilities @ positions,
+    }).sort_values('expected_position').reset_index(drop=True)
+
+
+# Simulation Monte Carlo d'une course complète : pilotes, positions de départ et météo
+def simulate_race(model, drivers, grid_positions, weather, n_sims=100_000, seed=None, profiles=None):
+    with span('simulation.distributions', drivers=len(drivers)):
+        names, mean, std = driver_distributions(model, drivers, grid_positions, weather, profiles)
+    with span('simulation.sample', n_sims=n_sims):
+        counts = simulate_positions(mean, std, n_sims, seed)
+    return summarize_positions(names, counts)
+
+
+# Même simulation pour plusieurs conditions météo, un scénario par processus
+def simulate_weather_scenarios(model, drivers, grid_positions, weathers, n_sims=100_000, workers=None, seed=None,
+                               profiles=None):
+    profiles = load_driver_profiles() if profiles is None else profiles
+    distributions = [driver_distributions(model, drivers, grid_positions, weather, profiles) for weather in weathers]
+    all_counts = simulate_many([(mean, std) for _, mean, std in distributions], n_sims, workers, seed)
+
+    results = []
+    for i, (weather, (names, _, _), counts) in enumerate(zip(weathers, distributions, all_counts)):
+        result = summarize_positions(names, counts)
+        result.insert(0, 'scenario', i)
+        for column, value in weather.items():
+            result[column] = value
+        results.append(result)
+    return pd.concat(results, ignore_index=True)
+
+
+if __name__ == '__main__':
+    from predict_pilot_performance import load_prediction_model
+
+    parser = argparse.ArgumentParser(description="Simuler l'ordre d'arrivée d'une course (Monte Carlo)")
+    parser.add_argument('--drivers', nargs='+', help='Noms des pilotes dans l\'ordre de la grille (20 premiers profils par défaut)')
+    parser.add_argument('--simulations', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=None, help='Processus de simulation (un scénario météo chacun)')
+    parser.add_argument('--temperature', type=float, nargs='+', default=[30])
+    parser.add_argument('--wind-speed', type=float, nargs='+', default=[4.2])
+    parser.add_argument('--humidity', type=float, nargs='+', default=[80])
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    model = load_prediction_model()
+    profiles = load_driver_profiles()
+    drivers = args.drivers or profiles['surname'].drop_nulls().unique(maintain_order=True).to_list()[:20]
+    # Scénarios météo : toutes les combinaisons des valeurs données
+    weathers = [
+        {'climate_temperature': temperature, 'gfs_wind_speed': wind_speed, 'gfs_humidity': humidity}
+        for temperature in args.temperature for wind_speed in args.wind_speed for humidity in args.humidity
+    ]
+
+    start = time.perf_counter()
+    result = simulate_weather_scenarios(model, drivers, range(1, len(drivers) + 1), weathers, args.simulations,
+                                        args.workers, args.seed, profiles)
+    print(result.to_string())
+    print(f'{len(weathers)} scénario(s) × {args.simulations} courses simulées en {time.perf_counter() - start:.2f}s')
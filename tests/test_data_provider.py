@@ -0,0 +1,199 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import polars as pl
+import pytest
+
+import data_provider
+from data_provider import ContentStore, DataProvider, HttpProvider, LocalDirectoryProvider, file_sha256
+
+NAME = 'weather_sample.parquet'
+
+
+# Petit fichier Parquet servant de source locale (plusieurs row groups, quelques dizaines de Ko)
+@pytest.fixture
+def source_dir(tmp_path):
+    directory = tmp_path / 'source'
+    directory.mkdir()
+    pl.DataFrame({
+        'fact_time': range(5000),
+        'fact_temperature': [float(i % 40) for i in range(5000)],
+    }).write_parquet(directory / NAME, row_group_size=1000)
+    return directory
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / 'cache'))
+
+
+# Source locale qui note l'octet de reprise de chaque appel
+class RecordingProvider(LocalDirectoryProvider):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.offsets = []
+
+    def fetch(self, name, f, offset=0):
+        self.offsets.append(offset)
+        super().fetch(name, f, offset)
+
+
+# Source locale coupée après `cut` octets au premier appel (transfert interrompu)
+class InterruptedProvider(RecordingProvider):
+    def __init__(self, directory, cut):
+        super().__init__(directory)
+        self.cut = cut
+
+    def fetch(self, name, f, offset=0):
+        if self.offsets:
+            return super().fetch(name, f, offset)
+        self.offsets.append(offset)
+        with open(os.path.join(self.directory, name), 'rb') as source:
+            f.write(source.read(self.cut))
+        raise ConnectionError('connexion coupée')
+
+
+def test_fetch_adds_file_under_its_sha256(source_dir, store):
+    path = store.fetch(NAME, LocalDirectoryProvider(str(source_dir)))
+
+    sha256 = file_sha256(source_dir / NAME)
+    assert path == store.object_path(sha256, NAME)
+    assert store.refs()[NAME] == {'sha256': sha256, 'size': os.path.getsize(source_dir / NAME)}
+    assert store.lookup(NAME, sha256) == path
+    assert not os.path.exists(store.partial_path(NAME))
+
+
+def test_checksum_mismatch_is_rejected(source_dir, store):
+    with pytest.raises(ValueError, match='empreinte'):
+        store.fetch(NAME, LocalDirectoryProvider(str(source_dir)), sha256='0' * 64)
+
+    assert store.refs() == {}
+    assert not os.path.exists(store.partial_path(NAME))
+
+
+def test_partial_file_is_resumed(source_dir, store):
+    data = (source_dir / NAME).read_bytes()
+    os.makedirs(os.path.dirname(store.partial_path(NAME)))
+    with open(store.partial_path(NAME), 'wb') as f:
+        f.write(data[:1000])
+
+    provider = RecordingProvider(str(source_dir))
+    path = store.fetch(NAME, provider)
+
+    assert provider.offsets == [1000]
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_interrupted_transfer_is_retried_from_received_bytes(source_dir, store, monkeypatch):
+    monkeypatch.setattr(data_provider, 'RETRY_DELAY_S', 0)
+    data = (source_dir / NAME).read_bytes()
+
+    provider = InterruptedProvider(str(source_dir), cut=len(data) // 2)
+    path = store.fetch(NAME, provider, sha256=file_sha256(source_dir / NAME))
+
+    assert provider.offsets == [0, len(data) // 2]
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_truncated_parquet_is_rejected(source_dir, store):
+    data = (source_dir / NAME).read_bytes()
+    (source_dir / NAME).write_bytes(data[:len(data) // 2])
+
+    with pytest.raises(ValueError, match='incomplet'):
+        store.fetch(NAME, LocalDirectoryProvider(str(source_dir)))
+
+    assert store.refs() == {}
+    assert not os.path.exists(store.partial_path(NAME))
+
+
+def test_lookup_verify_detects_corrupted_object(source_dir, store):
+    path = store.fetch(NAME, LocalDirectoryProvider(str(source_dir)))
+    data = bytearray(open(path, 'rb').read())
+    data[100] ^= 0xFF
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    # Même taille : seule la vérification de l'empreinte détecte la corruption
+    assert store.lookup(NAME) == path
+    assert store.lookup(NAME, verify=True) is None
+
+
+def test_materialize_places_cached_file_at_target(source_dir, store, tmp_path):
+    provider = DataProvider(store, [LocalDirectoryProvider(str(source_dir))], datasets={})
+    target = str(tmp_path / 'work' / NAME)
+
+    assert provider.materialize(NAME, target) == target
+    assert open(target, 'rb').read() == (source_dir / NAME).read_bytes()
+    assert store.lookup(NAME) is not None
+    assert not os.path.exists(target + '.tmp')
+
+
+def test_materialize_keeps_existing_working_file(source_dir, store, tmp_path):
+    provider = DataProvider(store, [LocalDirectoryProvider(str(source_dir))], datasets={})
+    target = tmp_path / NAME
+    target.write_bytes(b'fichier local')
+
+    provider.materialize(NAME, str(target))
+
+    assert target.read_bytes() == b'fichier local'
+    assert store.refs() == {}
+
+
+def test_materialize_uses_cache_before_sources(source_dir, store, tmp_path):
+    DataProvider(store, [LocalDirectoryProvider(str(source_dir))], datasets={}).path(NAME)
+    offline = DataProvider(store, [LocalDirectoryProvider(str(tmp_path / 'empty'))], datasets={})
+
+    target = offline.materialize(NAME, str(tmp_path / NAME))
+
+    assert open(target, 'rb').read() == (source_dir / NAME).read_bytes()
+
+
+def test_missing_file_raises_file_not_found(store, tmp_path):
+    provider = DataProvider(store, [LocalDirectoryProvider(str(tmp_path))], datasets={})
+
+    with pytest.raises(FileNotFoundError, match=NAME):
+        provider.materialize(NAME, str(tmp_path / 'work' / NAME))
+
+
+# Serveur HTTP local qui ferme chaque réponse après `cut` octets (Range pris en charge)
+@pytest.fixture
+def cutting_server(source_dir):
+    data = (source_dir / NAME).read_bytes()
+    cut = len(data) // 3 + 1
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start = 0
+            if self.headers.get('Range'):
+                start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(len(data) - start))
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(data[start:start + cut])
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/{NAME}', data
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_truncated_response_is_resumed(cutting_server, store, monkeypatch):
+    monkeypatch.setattr(data_provider, 'RETRY_DELAY_S', 0)
+    url, data = cutting_server
+
+    path = store.fetch(NAME, HttpProvider({NAME: url}))
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
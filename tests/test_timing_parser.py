@@ -0,0 +1,43 @@
+import polars as pl
+import pytest
+
+from timing_parser import parse_timing_ms, with_timing_ms
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('23.251', 23_251),
+    ('+17.181', 17_181),
+    ('1:26.572', 86_572),
+    ('16:44.718', 1_004_718),
+    ('1:34:50.616', 5_690_616),
+    ('17:22:34', 62_554_000),
+    # Sans unité supérieure, secondes et minutes ne sont pas limitées
+    ('75.2', 75_200),
+    ('90:00', 5_400_000),
+    ('1:59.999', 119_999),
+    ('0:00:00', 0),
+])
+def test_valid_times(value, expected):
+    assert parse_timing_ms([value]).to_list() == [expected]
+
+
+@pytest.mark.parametrize('value', [
+    '+', '\\N', '', '+1 Lap', 'nan', 'inf', '-inf', '+nan',
+    '1.5:10', 'a:1:2', '1:2:3:4', '-5',
+    # Minutes / secondes hors de 0-59 sous une unité supérieure
+    '1:60.000', '1:75', '1:60:00', '1:00:60',
+])
+def test_invalid_times_are_null(value):
+    assert parse_timing_ms([value]).to_list() == [None]
+
+
+def test_null_and_mixed_values():
+    assert parse_timing_ms([None, '1:26.572', 'nan']).to_list() == [None, 86_572, None]
+
+
+def test_with_timing_ms_adds_suffixed_columns():
+    df = pl.DataFrame({'q1': ['1:26.572', ''], 'q2': ['1:25.001', '\\N']})
+    result = with_timing_ms(df, ['q1', 'q2'])
+    assert result['q1_ms'].to_list() == [86_572, None]
+    assert result['q2_ms'].to_list() == [85_001, None]
+    assert result['q1'].to_list() == ['1:26.572', '']
@@ -0,0 +1,114 @@
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pytest
+
+from data_provider import ContentStore, DataProvider, LocalDirectoryProvider
+from weather_cache import build_weather_cache
+from weather_data import ESSENTIAL_COLUMNS, ensure_weather_file, filter_weather_by_circuit, weather_summary
+
+RADIUS_KM = 200
+
+CIRCUITS = [
+    # circuitId, nom, latitude, longitude
+    (1, 'Marina Bay Street Circuit', 1.2914, 103.864),
+    (2, 'Autodromo Nazionale di Monza', 45.6156, 9.28111),
+    (3, 'Reykjavik', 64.1466, -21.9426),
+]
+
+# Observations : trois près de Marina Bay, deux près de Monza, une à Sydney (loin de tout circuit)
+OBSERVATIONS = [
+    (1.30, 103.80, 30.0),
+    (1.35, 103.90, 31.0),
+    (1.25, 103.85, 29.0),
+    (45.60, 9.30, 20.0),
+    (45.50, 9.20, 22.0),
+    (-33.87, 151.21, 18.0),
+]
+
+
+# Dossier de données minimal : circuits.csv et un petit Parquet météo
+@pytest.fixture
+def data_root(tmp_path):
+    pl.DataFrame({
+        'circuitId': [c[0] for c in CIRCUITS],
+        'circuitRef': [f'circuit_{c[0]}' for c in CIRCUITS],
+        'name': [c[1] for c in CIRCUITS],
+        'location': ['-'] * len(CIRCUITS),
+        'country': ['-'] * len(CIRCUITS),
+        'lat': [c[2] for c in CIRCUITS],
+        'lng': [c[3] for c in CIRCUITS],
+        'alt': [0] * len(CIRCUITS),
+        'url': ['-'] * len(CIRCUITS),
+    }).write_csv(tmp_path / 'circuits.csv')
+
+    n = len(OBSERVATIONS)
+    pl.DataFrame({
+        'fact_time': [1_600_000_000 + 3600 * i for i in range(n)],
+        'fact_latitude': [o[0] for o in OBSERVATIONS],
+        'fact_longitude': [o[1] for o in OBSERVATIONS],
+        'fact_temperature': [o[2] for o in OBSERVATIONS],
+        'climate_temperature': [o[2] - 1 for o in OBSERVATIONS],
+        'gfs_pressure': [1010.0 + i for i in range(n)],
+        'gfs_humidity': [70.0 + i for i in range(n)],
+        'gfs_wind_speed': [5.0 + i for i in range(n)],
+    }).write_parquet(tmp_path / 'weather_sample.parquet')
+    return tmp_path
+
+
+def _filter(data_root, circuit_name, output='polars'):
+    return filter_weather_by_circuit(circuit_name, str(data_root / 'weather_sample.parquet'), RADIUS_KM, output,
+                                     cache_dir=str(data_root / 'weather_cache'), data_root=str(data_root))
+
+
+def _summary(data_root, circuit_name):
+    return weather_summary(circuit_name, str(data_root / 'weather_sample.parquet'), RADIUS_KM,
+                           cache_dir=str(data_root / 'weather_cache'), data_root=str(data_root))
+
+
+def test_filter_returns_observations_within_radius(data_root):
+    df = _filter(data_root, 'Marina Bay Street Circuit')
+
+    assert df.columns == ESSENTIAL_COLUMNS
+    assert sorted(df['fact_temperature'].to_list()) == [29.0, 30.0, 31.0]
+
+
+def test_filter_unknown_or_empty_circuit_returns_none(data_root):
+    assert _filter(data_root, 'Circuit inconnu') is None
+    assert _filter(data_root, 'Reykjavik') is None
+
+
+def test_filter_output_formats(data_root):
+    assert isinstance(_filter(data_root, 'Autodromo Nazionale di Monza', 'arrow'), pa.Table)
+    df = _filter(data_root, 'Autodromo Nazionale di Monza', 'pandas')
+    assert isinstance(df, pd.DataFrame)
+    assert len(df) == 2
+
+
+def test_summary_without_cache(data_root):
+    stats = _summary(data_root, 'Autodromo Nazionale di Monza')
+
+    assert stats['n_rows'] == 2
+    assert stats['fact_temperature'] == {'min': 20.0, 'max': 22.0, 'mean': 21.0}
+    assert _summary(data_root, 'Reykjavik') is None
+
+
+def test_cached_partitions_give_same_results(data_root):
+    before = _filter(data_root, 'Marina Bay Street Circuit').sort('fact_temperature')
+    stats_before = _summary(data_root, 'Marina Bay Street Circuit')
+
+    build_weather_cache(str(data_root / 'weather_sample.parquet'), str(data_root / 'circuits.csv'),
+                        str(data_root / 'weather_cache'), RADIUS_KM)
+
+    assert _filter(data_root, 'Marina Bay Street Circuit').sort('fact_temperature').equals(before)
+    assert _summary(data_root, 'Marina Bay Street Circuit') == stats_before
+    assert _summary(data_root, 'Reykjavik') is None
+
+
+def test_ensure_weather_file_fetches_missing_file_from_local_source(data_root, tmp_path_factory):
+    work = tmp_path_factory.mktemp('work')
+    provider = DataProvider(ContentStore(str(work / 'cache')), [LocalDirectoryProvider(str(data_root))], datasets={})
+
+    path = ensure_weather_file(str(work / 'weather_sample.parquet'), provider)
+
+    assert pl.read_parquet(path).equals(pl.read_parquet(data_root / 'weather_sample.parquet'))
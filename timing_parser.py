@@ -0,0 +1,109 @@
+import argparse
+import time
+
+import numpy as np
+import polars as pl
+
+# Valeur nulle des CSV Ergast (déjà convertie en null par data_store, mais acceptée ici
+# pour les chaînes brutes)
+NULL_MARKER = '\\N'
+
+# Temps valide : [+][[H:]M:]S[.fff], uniquement des chiffres (une partie illisible rend
+# tout le temps null au lieu de compter pour 0). Minutes et secondes sont limitées à 0-59
+# quand une unité supérieure est présente ("1:60.000" est refusé, "75.2" ou "90:00" non).
+TIMING_PATTERN = r'^\+?(?:(?:\d+:[0-5]?\d|\d+):[0-5]?\d(?:\.\d+)?|\d+(?:\.\d+)?)$'
+
+# Colonnes ajoutées à la table de features (disponibles pour l'entraînement, hors FEATURE_COLUMNS)
+TIMING_FEATURES = ['qualifying_gap_ms', 'pit_stop_count', 'pit_stop_total_ms']
+
+
+# Expression Polars : chaîne de temps → millisecondes (Int64), entièrement vectorisée.
+# Formats acceptés, [+][[H:]M:]S[.fff] : temps de course ("1:34:50.616"), écart ("+17.181"),
+# meilleur tour / qualification ("1:26.572"), durée d'arrêt ("23.251", "16:44.718") ou
+# heure du jour ("17:22:34"). Les autres valeurs ("+1 Lap", "\N", "", "nan", "1.5:10", "1:60.000")
+# donnent null.
+# Les parties sont comptées depuis la fin : secondes, puis minutes, puis heures (0 si absentes).
+def timing_ms_expr(column):
+    parts = pl.col(column).str.strip_chars_start('+').str.split(':')
+    seconds = parts.list.get(-1, null_on_oob=True).cast(pl.Float64, strict=False)
+    minutes = parts.list.get(-2, null_on_oob=True).cast(pl.Int64, strict=False).fill_null(0)
+    hours = parts.list.get(-3, null_on_oob=True).cast(pl.Int64, strict=False).fill_null(0)
+    return (
+        pl.when(pl.col(column).str.contains(TIMING_PATTERN))
+        .then((hours * 60 + minutes) * 60_000 + (seconds * 1000).round().cast(pl.Int64, strict=False))
+        .alias(column)
+    )
+
+
+# Version pour une Series / une liste / un tableau NumPy de chaînes (moteur streaming :
+# la colonne est traitée par morceaux)
+def parse_timing_ms(values):
+    series = values if isinstance(values, pl.Series) else pl.Series('value', values, dtype=pl.String)
+    return series.to_frame('value').lazy().select(timing_ms_expr('value')).collect(engine='streaming')['value']
+
+
+# Convertir plusieurs colonnes de temps d'un DataFrame / LazyFrame, avec le suffixe _ms
+def with_timing_ms(df, columns, suffix='_ms'):
+    return df.with_columns(timing_ms_expr(column).alias(f'{column}{suffix}') for column in columns)
+
+
+# Écart au poleman en qualification : meilleur temps du pilote (Q1, Q2 ou Q3) moins
+# le meilleur temps de la séance, une ligne par (raceId, driverId)
+def qualifying_gap(df_qualifying):
+    best = pl.min_horizontal(*[timing_ms_expr(column) for column in ('q1', 'q2', 'q3')])
+    return (
+        df_qualifying.lazy()
+        .select('raceId', 'driverId', best.alias('best_ms'))
+        .with_columns((pl.col('best_ms') - pl.col('best_ms').min().over('raceId')).alias('qualifying_gap_ms'))
+        .group_by('raceId', 'driverId')
+        .agg(pl.col('qualifying_gap_ms').min())
+    )
+
+
+# Arrêts aux stands par (raceId, driverId) : nombre et durée totale
+def pit_stop_totals(df_pit_stops):
+    return (
+        df_pit_stops.lazy()
+        .group_by('raceId', 'driverId')
+        .agg(
+            pl.len().cast(pl.Int64).alias('pit_stop_count'),
+            timing_ms_expr('duration').sum().alias('pit_stop_total_ms'),
+        )
+    )
+
+
+# Ajouter les features de temps à chaque ligne (raceId, driverId) ; un pilote sans arrêt
+# enregistré a 0 arrêt, sans qualification connue l'écart reste null
+def add_timing_features(df_combined, df_qualifying, df_pit_stops):
+    return (
+        df_combined.lazy()
+        .join(qualifying_gap(df_qualifying), on=['raceId', 'driverId'], how='left')
+        .join(pit_stop_totals(df_pit_stops), on=['raceId', 'driverId'], how='left')
+        .with_columns(pl.col('pit_stop_count', 'pit_stop_total_ms').fill_null(0))
+    )
+
+
+# Colonne synthétique mélangeant tous les formats rencontrés dans les tables Ergast
+def synthetic_timings(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    race = [f'{h}:{m:02d}:{s:02d}.{ms:03d}' for h, m, s, ms in zip(
+        rng.integers(1, 3, 1000), rng.integers(0, 60, 1000), rng.integers(0, 60, 1000), rng.integers(0, 1000, 1000))]
+    gap = [f'+{s}.{ms:03d}' for s, ms in zip(rng.integers(0, 90, 1000), rng.integers(0, 1000, 1000))]
+    lap = [f'{m}:{s:02d}.{ms:03d}' for m, s, ms in zip(rng.integers(1, 3, 1000), rng.integers(0, 60, 1000), rng.integers(0, 1000, 1000))]
+    pit = [f'{s}.{ms:03d}' for s, ms in zip(rng.integers(15, 40, 1000), rng.integers(0, 1000, 1000))]
+    day = [f'{h}:{m:02d}:{s:02d}' for h, m, s in zip(rng.integers(10, 20, 1000), rng.integers(0, 60, 1000), rng.integers(0, 60, 1000))]
+    pool = np.array(race + gap + lap + pit + day + ['+1 Lap', '+2 Laps', NULL_MARKER, ''], dtype=object)
+    return pl.Series('time', pool[rng.integers(0, len(pool), n_rows)], dtype=pl.String)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mesurer le parseur de temps sur des données synthétiques')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='Nombre de lignes synthétiques')
+    args = parser.parse_args()
+
+    values = synthetic_timings(args.rows)
+    start = time.perf_counter()
+    parsed = parse_timing_ms(values)
+    elapsed = time.perf_counter() - start
+    print(f'{args.rows} temps convertis en {elapsed:.2f}s ({args.rows / elapsed / 1e6:.1f} M lignes/s), '
+          f'{parsed.null_count()} nulls')
@@ -1,68 +1,228 @@
-import polars as pl
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
-import joblib
-import matplotlib.pyplot as plt
-
-# Charger les données combinées avec l'historique des pilotes
-df_combined = pl.read_csv('C:/Users/mazgo/Downloads/singapore_combined_with_pilot_history.csv')
-
-# Convertir la colonne 'position' en type numérique, en remplaçant les valeurs non numériques par NaN
-df_combined = df_combined.with_columns(
-    pl.col('position').cast(pl.Float64, strict=False).alias('position')
-)
-
-# Filtrer les lignes où 'position' est valide (i.e., non-null et non NaN)
-df_combined = df_combined.filter(pl.col('position').is_not_null())
-
-# Sélectionner les features supplémentaires incluant l'historique des pilotes
-features = df_combined.select([
-    'climate_temperature', 
-    'gfs_wind_speed', 
-    'gfs_humidity', 
-    'grid',  # Position de départ
-    'total_wins',  # Total des victoires du pilote
-    'total_points',  # Points cumulés du pilote
-    'average_position'  # Position moyenne du pilote
-])
-
-target = df_combined['position']  # Résultat final du pilote (cible)
-
-# Convertir en DataFrame Pandas pour l'entraînement du modèle
-X = features.to_pandas()
-y = target.to_pandas()
-
-# Diviser les données en ensemble d'entraînement et de test
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Entraîner le modèle RandomForest
-model = RandomForestRegressor()
-model.fit(X_train, y_train)
-
-# Prédire les résultats sur l'ensemble de test
-y_pred = model.predict(X_test)
-
-# Calculer l'erreur quadratique moyenne
-mse = mean_squared_error(y_test, y_pred)
-print(f"RMSE (RandomForest): {mse ** 0.5}")
-
-# *** Ajouter l'importance des features ***
-importances = model.feature_importances_
-feature_names = X.columns
-
-# Afficher les features avec leur importance
-for feature, importance in zip(feature_names, importances):
-    print(f"{feature}: {importance}")
-
-# Visualiser l'importance des features avec un graphique
-plt.figure(figsize=(10, 6))
-plt.barh(feature_names, importances)
-plt.xlabel('Importance')
-plt.ylabel('Features')
-plt.title('Importance des Features dans le Modèle')
-plt.show()
-
-# Sauvegarder le modèle entraîné
-joblib.dump(model, 'C:/Users/mazgo/Downloads/f1_prediction_model_with_pilot_history.pkl')
+import polars as pl
+
+from feature_store import scan_features
+from forest_export import export_forest, forest_dir, load_forest, max_prediction_error
+from instrumentation import span
+from feature_pipeline import DEFAULT_MODEL_PATH, FEATURE_COLUMNS, TARGET_COLUMN, features_path
+
+
+# Grille d'hyperparamètres explorée par --search
+SEARCH_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 20, 10],
+    'min_samples_leaf': [1, 5],
+    'max_features': [1.0, 'sqrt'],
+}
+
+# Colonnes possibles pour regrouper les folds (une course ou une saison n'est jamais
+# à la fois en entraînement et en validation)
+GROUP_COLUMNS = ('raceId', 'year')
+
+# Un candidat est abandonné si son RMSE moyen dépasse celui du meilleur de plus de ce facteur
+PRUNE_TOLERANCE = 0.05
+
+DEFAULT_SEARCH_LOG = os.path.join(os.path.dirname(DEFAULT_MODEL_PATH), 'search_results.csv')
+
+
+# Charger la table de features produite par feature_pipeline.py
+# (fichier Parquet unique ou magasin partitionné du mode incrémental)
+def load_training_data(path, group_by=None):
+    df_combined = scan_features(path).collect()
+
+    # La position est déjà un entier nullable (abandon, disqualification = null) :
+    # garder uniquement les lignes où elle est renseignée
+    df_combined = df_combined.filter(pl.col(TARGET_COLUMN).is_not_null())
+
+    # Sélectionner les features incluant l'historique des pilotes
+    X = df_combined.select(FEATURE_COLUMNS).to_pandas()
+    # Résultat final du pilote (cible)
+    y = df_combined[TARGET_COLUMN].cast(pl.Float64).to_pandas()
+    if group_by is not None:
+        # Groupes des folds de validation croisée (course ou saison de chaque ligne)
+        return X, y, df_combined[group_by].to_numpy()
+    return X, y
+
+
+# scikit-learn, joblib et matplotlib sont importés dans les fonctions qui les utilisent :
+# charger les données d'entraînement (benchmark_suite.py...) ne les importe pas
+
+# Entraîner le modèle RandomForest sur un découpage 80/20 et afficher le RMSE
+def train_model(X, y):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error
+    from sklearn.model_selection import train_test_split
+
+    # Diviser les données en ensemble d'entraînement et de test
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Entraîner le modèle RandomForest
+    model = RandomForestRegressor()
+    model.fit(X_train, y_train)
+
+    # Prédire les résultats sur l'ensemble de test
+    y_pred = model.predict(X_test)
+
+    # Calculer l'erreur quadratique moyenne
+    mse = mean_squared_error(y_test, y_pred)
+    print(f"RMSE (RandomForest): {mse ** 0.5}")
+    return model
+
+
+# Matrices de chaque fold construites une seule fois (float32, comme scikit-learn en interne)
+# et réutilisées par tous les candidats ; joblib les partage entre processus par memmap
+def build_folds(X, y, groups, n_splits=5):
+    from sklearn.model_selection import GroupKFold
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float64)
+    n_splits = min(n_splits, len(np.unique(groups)))
+    return [
+        (X[train], y[train], X[test], y[test])
+        for train, test in GroupKFold(n_splits=n_splits).split(X, y, groups)
+    ]
+
+
+# Entraîner et évaluer un candidat sur un fold : RMSE, temps d'entraînement et de
+# prédiction, taille du modèle sérialisé
+def evaluate_fold(params, fold):
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error
+
+    X_train, y_train, X_test, y_test = fold
+    model = RandomForestRegressor(random_state=42, n_jobs=1, **params)
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_s = time.perf_counter() - start
+
+    return {
+        'rmse': mean_squared_error(y_test, y_pred) ** 0.5,
+        'fit_s': fit_s,
+        'predict_ms_per_row': predict_s * 1000 / max(len(X_test), 1),
+        'size_mb': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1e6,
+    }
+
+
+# Recherche d'hyperparamètres par validation croisée groupée, en parallèle sur tous les cœurs :
+# les folds sont évalués un par un pour tous les candidats encore en course, et les candidats
+# dont le RMSE moyen dépasse nettement celui du meilleur sont abandonnés avant les folds suivants
+def search_hyperparameters(X, y, groups, grid=SEARCH_GRID, n_splits=5, n_jobs=-1, prune_tolerance=PRUNE_TOLERANCE):
+    import joblib
+    from sklearn.model_selection import ParameterGrid
+
+    folds = build_folds(X, y, groups, n_splits)
+    candidates = list(ParameterGrid(grid))
+    scores = {i: [] for i in range(len(candidates))}
+    alive = list(range(len(candidates)))
+
+    with joblib.Parallel(n_jobs=n_jobs) as parallel:
+        for k, fold in enumerate(folds):
+            results = parallel(joblib.delayed(evaluate_fold)(candidates[i], fold) for i in alive)
+            for i, result in zip(alive, results):
+                scores[i].append(result)
+
+            mean_rmse = {i: np.mean([r['rmse'] for r in scores[i]]) for i in alive}
+            best = min(mean_rmse.values())
+            pruned = [i for i in alive if mean_rmse[i] > best * (1 + prune_tolerance)]
+            alive = [i for i in alive if i not in pruned]
+            print(f'Fold {k + 1}/{len(folds)} : {len(results)} candidats évalués, {len(pruned)} abandonnés')
+
+    rows = []
+    for i, params in enumerate(candidates):
+        folds_done = pd.DataFrame(scores[i])
+        rows.append({
+            **{name: str(value) for name, value in params.items()},
+            'folds': len(folds_done),
+            'pruned': i not in alive,
+            'rmse': folds_done['rmse'].mean(),
+            'fit_s': folds_done['fit_s'].mean(),
+            'predict_ms_per_row': folds_done['predict_ms_per_row'].mean(),
+            'size_mb': folds_done['size_mb'].mean(),
+        })
+    results = pd.DataFrame(rows).sort_values(['pruned', 'rmse']).reset_index(drop=True)
+    best_params = candidates[min(alive, key=lambda i: np.mean([r['rmse'] for r in scores[i]]))]
+    return results, best_params
+
+
+# Afficher et visualiser l'importance des features
+def show_feature_importances(model, feature_names):
+    import matplotlib.pyplot as plt
+
+    importances = model.feature_importances_
+
+    # Afficher les features avec leur importance
+    for feature, importance in zip(feature_names, importances):
+        print(f"{feature}: {importance}")
+
+    # Visualiser l'importance des features avec un graphique
+    plt.figure(figsize=(10, 6))
+    plt.barh(feature_names, importances)
+    plt.xlabel('Importance')
+    plt.ylabel('Features')
+    plt.title('Importance des Features dans le Modèle')
+    plt.show()
+
+
+if __name__ == '__main__':
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+
+    parser = argparse.ArgumentParser(description='Entraîner le modèle de prédiction des positions')
+    parser.add_argument('--features', default=features_path(), help='Table de features (Parquet) ou dossier du magasin incrémental')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help='Fichier de sortie du modèle')
+    parser.add_argument('--no-plot', action='store_true', help="Ne pas afficher le graphique d'importance")
+    parser.add_argument('--no-export', action='store_true',
+                        help='Ne pas exporter le modèle aplati (tableaux NumPy) pour la prédiction rapide')
+    parser.add_argument('--search', action='store_true',
+                        help="Recherche d'hyperparamètres par validation croisée groupée avant l'entraînement final")
+    parser.add_argument('--group-by', choices=GROUP_COLUMNS, default='raceId', help='Groupes des folds (--search)')
+    parser.add_argument('--folds', type=int, default=5, help='Nombre de folds (--search)')
+    parser.add_argument('--jobs', type=int, default=-1, help='Processus parallèles (--search, -1 = tous les cœurs)')
+    parser.add_argument('--search-log', default=DEFAULT_SEARCH_LOG, help='Fichier CSV des résultats (--search)')
+    args = parser.parse_args()
+
+    if args.search:
+        with span('train.load'):
+            X, y, groups = load_training_data(args.features, group_by=args.group_by)
+        with span('train.search'):
+            results, best_params = search_hyperparameters(X, y, groups, n_splits=args.folds, n_jobs=args.jobs)
+        print(results.to_string())
+        os.makedirs(os.path.dirname(args.search_log) or '.', exist_ok=True)
+        results.to_csv(args.search_log, index=False)
+        print(f'Meilleurs paramètres : {best_params} (résultats dans {args.search_log})')
+
+        # Modèle final entraîné sur toutes les données avec les meilleurs paramètres
+        with span('train.fit'):
+            model = RandomForestRegressor(random_state=42, n_jobs=-1, **best_params).fit(X, y)
+    else:
+        with span('train.load'):
+            X, y = load_training_data(args.features)
+        with span('train.fit'):
+            model = train_model(X, y)
+
+    if not args.no_plot:
+        show_feature_importances(model, X.columns)
+
+    # Sauvegarder le modèle entraîné
+    os.makedirs(os.path.dirname(args.model) or '.', exist_ok=True)
+    with span('train.save'):
+        joblib.dump(model, args.model)
+
+    # Exporter la forêt en tableaux NumPy mappables et vérifier qu'elle prédit comme scikit-learn
+    if not args.no_export:
+        with span('train.export'):
+            path = export_forest(model, forest_dir(args.model))
+        with span('train.check_export'):
+            error = max_prediction_error(model, load_forest(path), X)
+        print(f'Modèle aplati exporté dans {path} (écart max avec scikit-learn : {error:.2e})')
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import time
+
+import polars as pl
+
+from data_provider import file_sha256
+from weather_index import DEFAULT_RADIUS_KM, scan_weather_radius
+
+# Dossier par défaut du cache des partitions météo par circuit
+DEFAULT_CACHE_DIR = 'weather_cache'
+
+# Colonnes dont le dashboard a besoin sous forme de statistiques (min / max / moyenne)
+STAT_COLUMNS = ['fact_temperature', 'gfs_pressure', 'gfs_humidity', 'gfs_wind_speed']
+
+SUMMARY_FILE = 'summary.parquet'
+MANIFEST_FILE = 'manifest.json'
+
+
+def partition_path(cache_dir, circuit_id):
+    return os.path.join(cache_dir, f'circuit_id={int(circuit_id)}.parquet')
+
+
+def read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(cache_dir, manifest):
+    tmp_path = os.path.join(cache_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, MANIFEST_FILE))
+
+
+# Le cache est valide si la taille et la date de modification du fichier source n'ont pas changé.
+# Si seule la date a changé (copie, nouveau téléchargement), on compare l'empreinte SHA-256.
+def cache_is_fresh(weather_path, cache_dir=DEFAULT_CACHE_DIR, radius_km=None):
+    manifest = read_manifest(cache_dir)
+    if manifest is None or not os.path.exists(weather_path):
+        return False
+    if radius_km is not None and manifest.get('radius_km') != radius_km:
+        return False
+
+    stat = os.stat(weather_path)
+    if manifest.get('source_size') != stat.st_size:
+        return False
+    if manifest.get('source_mtime') == stat.st_mtime:
+        return True
+    if manifest.get('source_sha256') != file_sha256(weather_path):
+        return False
+
+    # Contenu identique : mémoriser la nouvelle date pour éviter de recalculer l'empreinte
+    manifest['source_mtime'] = stat.st_mtime
+    _write_manifest(cache_dir, manifest)
+    return True
+
+
+def _summary_exprs():
+    exprs = [pl.len().alias('n_rows')]
+    for column in STAT_COLUMNS:
+        exprs += [
+            pl.col(column).min().alias(f'{column}_min'),
+            pl.col(column).max().alias(f'{column}_max'),
+            pl.col(column).mean().alias(f'{column}_mean'),
+        ]
+    return exprs
+
+
+def _stats_from_row(row):
+    stats = {'n_rows': row['n_rows']}
+    for column in STAT_COLUMNS:
+        stats[column] = {agg: row[f'{column}_{agg}'] for agg in ('min', 'max', 'mean')}
+    return stats
+
+
+# Étape de construction hors ligne : une partition Parquet par circuit (clé circuitId)
+# et une table de statistiques précalculées pour le dashboard
+def build_weather_cache(weather_path, circuits_path='circuits.csv', cache_dir=DEFAULT_CACHE_DIR,
+                        radius_km=DEFAULT_RADIUS_KM):
+    os.makedirs(cache_dir, exist_ok=True)
+    circuits = pl.read_csv(circuits_path, columns=['circuitId', 'name', 'lat', 'lng'])
+    source_columns = [c for c in pl.scan_parquet(weather_path).collect_schema().names() if c != 'cell_id']
+
+    summaries = []
+    for circuit in circuits.iter_rows(named=True):
+        start = time.perf_counter()
+        path = partition_path(cache_dir, circuit['circuitId'])
+        scan_weather_radius(
+            weather_path, circuit['lat'], circuit['lng'], radius_km, columns=source_columns
+        ).sink_parquet(path)
+
+        summary = pl.scan_parquet(path).select(_summary_exprs()).collect()
+        summaries.append(summary.with_columns(pl.lit(circuit['circuitId']).cast(pl.Int64).alias('circuitId')))
+        print(f"{circuit['name']}: {summary['n_rows'][0]} lignes en {time.perf_counter() - start:.2f}s")
+
+    pl.concat(summaries).select('circuitId', pl.exclude('circuitId')).write_parquet(
+        os.path.join(cache_dir, SUMMARY_FILE)
+    )
+
+    stat = os.stat(weather_path)
+    _write_manifest(cache_dir, {
+        'source': os.path.abspath(weather_path),
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime,
+        'source_sha256': file_sha256(weather_path),
+        'radius_km': radius_km,
+        'built_at': time.time(),
+    })
+    return cache_dir
+
+
+def ensure_weather_cache(weather_path, circuits_path='circuits.csv', cache_dir=DEFAULT_CACHE_DIR,
+                         radius_km=DEFAULT_RADIUS_KM):
+    if not cache_is_fresh(weather_path, cache_dir, radius_km):
+        build_weather_cache(weather_path, circuits_path, cache_dir, radius_km)
+    return cache_dir
+
+
+# Charger toutes les statistiques précalculées : {circuitId: {colonne: {'min', 'max', 'mean'}}}
+def load_weather_summaries(cache_dir=DEFAULT_CACHE_DIR):
+    path = os.path.join(cache_dir, SUMMARY_FILE)
+    if not os.path.exists(path):
+        return {}
+
+    return {
+        row['circuitId']: _stats_from_row(row)
+        for row in pl.read_parquet(path).iter_rows(named=True)
+    }
+
+
+# Lire la partition complète d'un circuit (seulement quand les lignes brutes sont nécessaires)
+def load_circuit_weather(circuit_id, cache_dir=DEFAULT_CACHE_DIR, columns=None):
+    path = partition_path(cache_dir, circuit_id)
+    if not os.path.exists(path):
+        return None
+    return pl.read_parquet(path, columns=columns)
+
+
+# Calculer les mêmes statistiques à la volée (quand le cache n'est pas construit)
+def summarize_weather(df):
+    return _stats_from_row(df.select(_summary_exprs()).row(0, named=True))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Construire le cache météo par circuit')
+    parser.add_argument('--weather', default='weather_sample.parquet', help='Fichier Parquet météo source')
+    parser.add_argument('--circuits', default='circuits.csv', help='Fichier CSV des circuits')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Dossier de sortie du cache')
+    parser.add_argument('--radius-km', type=float, default=DEFAULT_RADIUS_KM, help='Rayon autour de chaque circuit (km)')
+    parser.add_argument('--force', action='store_true', help='Reconstruire même si le cache est à jour')
+    args = parser.parse_args()
+
+    if args.force or not cache_is_fresh(args.weather, args.cache_dir, args.radius_km):
+        build_weather_cache(args.weather, args.circuits, args.cache_dir, args.radius_km)
+    else:
+        print(f'Cache {args.cache_dir} à jour pour {args.weather}')
@@ -0,0 +1,123 @@
+import io
+import os
+import zipfile
+
+import polars as pl
+import pyarrow as pa
+
+from data_provider import default_provider
+from data_store import load_table
+from instrumentation import span
+from weather_cache import DEFAULT_CACHE_DIR, cache_is_fresh, load_circuit_weather, load_weather_summaries, summarize_weather
+from weather_index import DEFAULT_RADIUS_KM, ensure_weather_index, scan_weather_radius
+
+# Échantillon météo attendu dans le dossier de travail (récupéré par data_provider.py s'il manque)
+WEATHER_FILE = 'weather_sample.parquet'
+
+# Colonnes renvoyées par filter_weather_by_circuit
+ESSENTIAL_COLUMNS = ['fact_latitude', 'fact_longitude', 'fact_temperature', 'gfs_pressure', 'gfs_humidity', 'gfs_wind_speed']
+
+# Formats de retour possibles pour les données météo filtrées
+OUTPUT_FORMATS = ('polars', 'arrow', 'pandas')
+
+
+# Fichier météo local et son index spatial : le fichier est pris dans le dossier de travail,
+# sinon dans le cache local, sinon récupéré par le fournisseur (dossier local, puis réseau)
+def ensure_weather_file(weather_path=WEATHER_FILE, provider=None):
+    if not os.path.exists(weather_path):
+        with span('weather.fetch'):
+            (provider or default_provider()).materialize(os.path.basename(weather_path), weather_path)
+    with span('weather.index'):
+        ensure_weather_index(weather_path)
+    return weather_path
+
+
+# Convertir le DataFrame Polars vers le format demandé sans copier les colonnes :
+# Arrow et pandas (types Arrow) partagent les buffers mémoire de Polars
+def to_output(df, output):
+    if output == 'polars':
+        return df
+    if output == 'arrow':
+        return df.to_arrow()
+    if output == 'pandas':
+        return df.to_pandas(use_pyarrow_extension_array=True)
+    raise ValueError(f"Format de sortie inconnu : {output!r} (attendu : {', '.join(OUTPUT_FORMATS)})")
+
+
+# Coordonnées et identifiant d'un circuit par son nom (première occurrence), ou None
+def circuit_location(circuit_name, data_root='.'):
+    with span('weather.circuits_table'):
+        circuits = load_table('circuits', data_root, os.path.join(data_root, 'data'))
+    circuit = circuits.filter(pl.col('name') == circuit_name).head(1)
+    if circuit.is_empty():
+        return None
+    return circuit['circuitId'][0], circuit['lat'][0], circuit['lng'][0]
+
+
+# Observations météo dans un rayon (km) autour d'un circuit : partition précalculée du cache
+# si elle est à jour, sinon requête sur l'index spatial. None si aucune observation.
+def filter_weather_by_circuit(circuit_name, weather_path=WEATHER_FILE, radius_km=DEFAULT_RADIUS_KM, output='polars',
+                              cache_dir=DEFAULT_CACHE_DIR, data_root='.'):
+    location = circuit_location(circuit_name, data_root)
+    if location is None:
+        return None
+    circuit_id, latitude, longitude = location
+
+    df_filtered_weather = None
+    if cache_is_fresh(weather_path, cache_dir, radius_km):
+        with span('weather.partition_read'):
+            df_filtered_weather = load_circuit_weather(circuit_id, cache_dir, columns=ESSENTIAL_COLUMNS)
+    if df_filtered_weather is None:
+        with span('weather.radius_scan'):
+            df_filtered_weather = scan_weather_radius(
+                weather_path, latitude, longitude, radius_km, columns=ESSENTIAL_COLUMNS
+            ).collect()
+
+    if df_filtered_weather.is_empty():
+        return None
+    return to_output(df_filtered_weather, output)
+
+
+# Statistiques météo (min / max / moyenne) d'un circuit : lues dans le cache précalculé
+# quand il est à jour, calculées à partir des données filtrées sinon
+def weather_summary(circuit_name, weather_path=WEATHER_FILE, radius_km=DEFAULT_RADIUS_KM,
+                    cache_dir=DEFAULT_CACHE_DIR, data_root='.', filter_weather=None):
+    if cache_is_fresh(weather_path, cache_dir, radius_km):
+        location = circuit_location(circuit_name, data_root)
+        if location is None:
+            return None
+        stats = load_weather_summaries(cache_dir).get(location[0])
+        if stats is None or stats['n_rows'] == 0:
+            return None
+        return stats
+
+    # filter_weather : version mise en cache de filter_weather_by_circuit (dashboard)
+    if filter_weather is None:
+        df_weather = filter_weather_by_circuit(circuit_name, weather_path, radius_km, cache_dir=cache_dir,
+                                               data_root=data_root)
+    else:
+        df_weather = filter_weather(circuit_name, radius_km)
+    if df_weather is None:
+        return None
+    with span('weather.summarize'):
+        return summarize_weather(df_weather)
+
+
+# Export explicite des données météo filtrées en CSV compressé (ZIP) pour le téléchargement
+def export_weather_zip(weather_df, circuit_name):
+    if weather_df is None:
+        return None
+    if not isinstance(weather_df, pl.DataFrame):
+        weather_df = pl.from_arrow(weather_df) if isinstance(weather_df, pa.Table) else pl.from_pandas(weather_df)
+
+    # Sauvegarder le CSV dans un buffer en mémoire
+    csv_buffer = io.BytesIO()
+    weather_df.write_csv(csv_buffer)
+
+    # Créer un fichier zip dans un buffer en mémoire
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr(f'{circuit_name}_weather.csv', csv_buffer.getvalue())
+
+    zip_buffer.seek(0)  # Revenir au début du buffer
+    return zip_buffer
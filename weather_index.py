@@ -0,0 +1,185 @@
+import json
+import math
+import os
+from functools import reduce
+
+import polars as pl
+
+# Taille d'une cellule de la grille spatiale (en degrés)
+CELL_SIZE_DEG = 1.0
+
+# Nombre de lignes par row group dans le Parquet indexé : plus c'est petit,
+# plus les lectures par cellule sont précises (au prix de métadonnées plus lourdes)
+ROW_GROUP_SIZE = 50_000
+
+# Rayon moyen de la Terre (km) et longueur d'un degré de latitude
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+# Rayon de recherche par défaut autour d'un circuit (km), commun au dashboard, au cache météo,
+# aux features et aux agrégats par course. Il remplace l'ancien rectangle de ±50° (plus de
+# 11 000 km du nord au sud, soit un continent entier autour du circuit) : les statistiques
+# affichées sont donc plus étroites qu'avant. ~5 560 km redonnerait l'étendue nord-sud de
+# l'ancien rectangle, mais chaque partition du cache contiendrait alors une grande partie de l'archive.
+DEFAULT_RADIUS_KM = 1000
+
+LAT_COLUMN = 'fact_latitude'
+LNG_COLUMN = 'fact_longitude'
+
+
+# Chemins de l'index : un Parquet trié par cellule + un fichier de métadonnées JSON,
+# enregistrés à côté du Parquet source
+def index_paths(parquet_path):
+    base, _ = os.path.splitext(parquet_path)
+    return f'{base}.grid.parquet', f'{base}.grid.json'
+
+
+def _n_lng_cells(cell_size_deg):
+    return int(math.ceil(360 / cell_size_deg))
+
+
+# Expression Polars qui calcule l'identifiant de cellule (ligne de latitude * nb colonnes + colonne)
+def cell_id_expr(cell_size_deg=CELL_SIZE_DEG, lat_col=LAT_COLUMN, lng_col=LNG_COLUMN):
+    n_lng = _n_lng_cells(cell_size_deg)
+    n_lat = int(math.ceil(180 / cell_size_deg))
+    lat_idx = ((pl.col(lat_col) + 90) / cell_size_deg).floor().cast(pl.Int64).clip(0, n_lat - 1)
+    lng_idx = ((pl.col(lng_col) + 180) / cell_size_deg).floor().cast(pl.Int64) % n_lng
+    return (lat_idx * n_lng + lng_idx).cast(pl.Int32).alias('cell_id')
+
+
+# Distance orthodromique (haversine) en km entre chaque ligne et un point fixe
+def haversine_km_expr(latitude, longitude, lat_col=LAT_COLUMN, lng_col=LNG_COLUMN):
+    lat1 = math.radians(latitude)
+    lat2 = pl.col(lat_col).radians()
+    dlat = lat2 - lat1
+    dlng = pl.col(lng_col).radians() - math.radians(longitude)
+    a = (dlat / 2).sin() ** 2 + math.cos(lat1) * lat2.cos() * (dlng / 2).sin() ** 2
+    return 2 * EARTH_RADIUS_KM * a.sqrt().clip(0, 1).arcsin()
+
+
+# Même distance entre deux paires de colonnes (observation et circuit associé ligne à ligne)
+def haversine_km_columns(lat_col, lng_col, other_lat_col, other_lng_col):
+    lat1 = pl.col(other_lat_col).radians()
+    lat2 = pl.col(lat_col).radians()
+    dlat = lat2 - lat1
+    dlng = pl.col(lng_col).radians() - pl.col(other_lng_col).radians()
+    a = (dlat / 2).sin() ** 2 + lat1.cos() * lat2.cos() * (dlng / 2).sin() ** 2
+    return 2 * EARTH_RADIUS_KM * a.sqrt().clip(0, 1).arcsin()
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Vérifier que l'index existe et correspond toujours au Parquet source
+def index_is_fresh(parquet_path):
+    index_path, meta_path = index_paths(parquet_path)
+    meta = _read_meta(meta_path)
+    if meta is None or not os.path.exists(index_path):
+        return False
+    stat = os.stat(parquet_path)
+    return meta.get('source_size') == stat.st_size and meta.get('source_mtime') == stat.st_mtime
+
+
+# Construire l'index spatial une seule fois : les lignes sont triées par cellule
+# pour que chaque cellule occupe une plage contiguë de row groups
+def build_weather_index(parquet_path, cell_size_deg=CELL_SIZE_DEG, row_group_size=ROW_GROUP_SIZE):
+    index_path, meta_path = index_paths(parquet_path)
+    tmp_path = index_path + '.tmp'
+
+    (
+        pl.scan_parquet(parquet_path)
+        .filter(pl.col(LAT_COLUMN).is_not_null() & pl.col(LNG_COLUMN).is_not_null())
+        .with_columns(cell_id_expr(cell_size_deg))
+        .sort('cell_id')
+        .sink_parquet(tmp_path, row_group_size=row_group_size, statistics=True)
+    )
+    os.replace(tmp_path, index_path)
+
+    stat = os.stat(parquet_path)
+    meta = {
+        'source': os.path.basename(parquet_path),
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime,
+        'cell_size_deg': cell_size_deg,
+        'row_group_size': row_group_size,
+    }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return index_path
+
+
+# Construire l'index seulement s'il est absent ou périmé, puis retourner son chemin
+def ensure_weather_index(parquet_path, cell_size_deg=CELL_SIZE_DEG):
+    if not index_is_fresh(parquet_path):
+        build_weather_index(parquet_path, cell_size_deg)
+    return index_paths(parquet_path)[0]
+
+
+# Plages d'identifiants de cellules couvrant le cercle (lat, lng, radius_km).
+# Pour chaque ligne de latitude, les cellules voisines en longitude sont contiguës.
+def cell_ranges(latitude, longitude, radius_km, cell_size_deg=CELL_SIZE_DEG):
+    n_lng = _n_lng_cells(cell_size_deg)
+    n_lat = int(math.ceil(180 / cell_size_deg))
+
+    dlat = radius_km / KM_PER_DEG
+    lat_min = max(-90.0, latitude - dlat)
+    lat_max = min(90.0, latitude + dlat)
+
+    # L'écart en longitude est le plus grand du côté le plus proche du pôle
+    max_abs_lat = max(abs(lat_min), abs(lat_max))
+    cos_lat = math.cos(math.radians(max_abs_lat))
+    if cos_lat < 1e-6 or radius_km / (KM_PER_DEG * cos_lat) >= 180:
+        lng_spans = [(0, n_lng - 1)]
+    else:
+        dlng = radius_km / (KM_PER_DEG * cos_lat)
+        lo = math.floor((longitude - dlng + 180) / cell_size_deg)
+        hi = math.floor((longitude + dlng + 180) / cell_size_deg)
+        if hi - lo + 1 >= n_lng:
+            lng_spans = [(0, n_lng - 1)]
+        elif lo < 0:
+            lng_spans = [(0, hi), (lo % n_lng, n_lng - 1)]
+        elif hi >= n_lng:
+            lng_spans = [(0, hi % n_lng), (lo, n_lng - 1)]
+        else:
+            lng_spans = [(lo, hi)]
+
+    row_min = min(n_lat - 1, int(math.floor((lat_min + 90) / cell_size_deg)))
+    row_max = min(n_lat - 1, int(math.floor((lat_max + 90) / cell_size_deg)))
+
+    ranges = []
+    for row in range(row_min, row_max + 1):
+        for lo, hi in lng_spans:
+            start, end = row * n_lng + lo, row * n_lng + hi
+            # Fusionner avec la plage précédente si elle est adjacente
+            if ranges and ranges[-1][1] + 1 >= start:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+            else:
+                ranges.append((start, end))
+    return ranges
+
+
+# Requête par rayon (km) sur l'index : seuls les row groups des cellules concernées sont lus
+def scan_weather_radius(parquet_path, latitude, longitude, radius_km, columns=None):
+    index_path = ensure_weather_index(parquet_path)
+    meta = _read_meta(index_paths(parquet_path)[1]) or {}
+    cell_size_deg = meta.get('cell_size_deg', CELL_SIZE_DEG)
+
+    ranges = cell_ranges(latitude, longitude, radius_km, cell_size_deg)
+    in_cells = reduce(
+        lambda acc, expr: acc | expr,
+        [pl.col('cell_id').is_between(lo, hi) for lo, hi in ranges],
+    )
+
+    lf = (
+        pl.scan_parquet(index_path)
+        .filter(in_cells)
+        .filter(haversine_km_expr(latitude, longitude) <= radius_km)
+    )
+    if columns is not None:
+        lf = lf.select(columns)
+    return lf
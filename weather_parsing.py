@@ -1,80 +1,59 @@
-import gdown
-import polars as pl
-import pandas as pd
-import io
-import zipfile
 import streamlit as st
-import os
-
-# URL Google Drive du fichier Parquet échantillonné
-file_id = '1A9duZC6CUH6aBfGKZ9wRe_UKlmdS9O8l'
-url = f'https://drive.google.com/uc?id={file_id}'
-
-# Télécharger et charger les données météo depuis Google Drive
-@st.cache_data
-def load_weather_data():
-    output = 'weather_sample.parquet'  # Nouveau nom pour l'échantillon
-    
-    # Vérifier si le fichier existe déjà pour éviter de télécharger plusieurs fois
-    if not os.path.exists(output):
-        # Télécharger le fichier à partir de Google Drive
-        gdown.download(url, output, quiet=False)
-
-    # Vérifier que le fichier a bien été téléchargé et est lisible
-    if os.path.exists(output):
-        try:
-            return pl.read_parquet(output)
-        except Exception as e:
-            st.error(f"Erreur lors de la lecture du fichier Parquet : {str(e)}")
-            return None
-    else:
-        st.error("Le fichier weather_sample.parquet n'a pas pu être téléchargé.")
+from memory_cache import ByteBudgetLRU
+from instrumentation import span, traced
+from weather_index import DEFAULT_RADIUS_KM
+# Fonctions météo sans Streamlit (scripts, tests) : voir weather_data.py
+from weather_data import OUTPUT_FORMATS, WEATHER_FILE, ensure_weather_file, export_weather_zip, weather_summary
+import weather_data
+
+weather_file = WEATHER_FILE  # Échantillon météo (Parquet)
+
+# Budget mémoire (octets) des données météo filtrées partagées entre toutes les sessions
+WEATHER_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Récupérer le fichier météo (dossier de travail, cache local, puis source configurée,
+# voir data_provider.py) et préparer son index spatial
+@st.cache_resource
+@traced('weather.download_check')
+def download_weather_data():
+    try:
+        return ensure_weather_file(weather_file)
+    except FileNotFoundError as e:
+        st.error(f"Le fichier {weather_file} n'a pas pu être récupéré : {e}")
         return None
-
-# Charger les fichiers circuits et météo
-@st.cache_data
-def filter_weather_by_circuit(circuit_name, margin=10, max_size_mb=10):
-    # Charger les fichiers circuits et météo
-    circuits_df = pd.read_csv('circuits.csv')  # Chemin relatif vers le fichier CSV des circuits
-    df_weather = load_weather_data()  # Appel à la fonction pour télécharger et charger le fichier Parquet
-
-    # Si le fichier météo n'a pas pu être chargé, arrêter la fonction
-    if df_weather is None:
+    except Exception as e:
+        st.error(f"Erreur lors de la lecture du fichier Parquet : {str(e)}")
         return None
 
-    # Obtenir les coordonnées du circuit sélectionné
-    circuit_data = circuits_df[circuits_df['name'] == circuit_name]
-    if circuit_data.empty:
+# Cache LRU des données météo filtrées, unique pour tout le processus : chaque partition
+# n'est gardée qu'une fois en mémoire quel que soit le nombre de sessions, et les circuits
+# les moins récemment consultés sont évincés au-delà du budget
+@st.cache_resource
+def shared_weather_cache():
+    return ByteBudgetLRU(WEATHER_CACHE_MAX_BYTES)
+
+# Données météo d'un circuit, partagées entre les sessions (à ne pas modifier)
+def filter_weather_by_circuit(circuit_name, radius_km=DEFAULT_RADIUS_KM, output='polars'):
+    with span('weather.filter', cache='hit', circuit=circuit_name) as s:
+        def load():
+            s.set(cache='miss')
+            weather_path = download_weather_data()
+            # Si le fichier météo n'a pas pu être chargé, arrêter la fonction
+            if weather_path is None:
+                return None
+            return weather_data.filter_weather_by_circuit(circuit_name, weather_path, radius_km, output)
+        return shared_weather_cache().get_or_load((circuit_name, radius_km, output), load)
+
+# Statistiques météo (min / max / moyenne) d'un circuit : lues dans le cache précalculé
+# quand il est à jour, calculées à partir des données filtrées sinon
+# (petit dictionnaire partagé entre les sessions, en lecture seule)
+@st.cache_resource
+@traced('weather.summary')
+def get_weather_summary(circuit_name, radius_km=DEFAULT_RADIUS_KM):
+    weather_path = download_weather_data()
+    if weather_path is None:
         return None
-    
-    latitude = circuit_data['lat'].values[0]
-    longitude = circuit_data['lng'].values[0]
+    return weather_summary(circuit_name, weather_path, radius_km, filter_weather=filter_weather_by_circuit)
 
-    # Filtrer les données météo pour ce circuit
-    df_filtered_weather = df_weather.filter(
-        (pl.col('fact_latitude').is_between(latitude - margin, latitude + margin)) &
-        (pl.col('fact_longitude').is_between(longitude - margin, longitude + margin))
-    )
-    
-    # Sélectionner seulement les colonnes pertinentes
-    essential_columns = ['fact_latitude', 'fact_longitude', 'fact_temperature', 'gfs_pressure', 'gfs_humidity', 'gfs_wind_speed']
-    df_filtered_weather = df_filtered_weather.select(essential_columns)
-
-    # Sauvegarder les données météo filtrées dans un fichier CSV compressé en mémoire
-    if df_filtered_weather.shape[0] > 0:
-        # Sauvegarder le CSV dans un buffer en mémoire
-        csv_buffer = io.BytesIO()
-        df_filtered_weather.write_csv(csv_buffer)
-        csv_buffer.seek(0)  # Revenir au début du buffer
-
-        # Créer un fichier zip dans un buffer en mémoire
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.writestr(f'{circuit_name}_weather.csv', csv_buffer.getvalue())
-        
-        zip_buffer.seek(0)  # Revenir au début du buffer
-
-        # Retourner le buffer ZIP pour utilisation
-        return zip_buffer
-    else:
-        return None
+# Export explicite des données météo filtrées en CSV compressé (ZIP) : export_weather_zip
+export_weather_zip = traced('weather.export_zip')(export_weather_zip)
@@ -0,0 +1,282 @@
+import argparse
+import bisect
+import glob
+import math
+import os
+import time
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from combine_weather_and_race import WEATHER_COLUMNS, race_start_expr
+from data_store import scan_table
+from instrumentation import span
+from weather_index import (
+    DEFAULT_RADIUS_KM, KM_PER_DEG, LAT_COLUMN, LNG_COLUMN, cell_id_expr, cell_ranges, haversine_km_columns,
+)
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure du pic mémoire
+    resource = None
+
+# Demi-largeur de la fenêtre de temps autour du départ de chaque course
+DEFAULT_WINDOW_HOURS = 12
+
+DEFAULT_OUTPUT_PATH = os.path.join('output', 'weather_race_windows.parquet')
+
+TIME_COLUMN = 'fact_time'
+SECONDS_PER_DAY = 86_400
+
+# Lignes lues par lot dans les row groups retenus (mémoire bornée quelle que soit l'archive)
+BATCH_ROWS = 1 << 18
+
+
+# Fichiers Parquet de l'archive : un fichier, un dossier ou un motif glob
+def archive_files(weather_path):
+    if os.path.isdir(weather_path):
+        return sorted(glob.glob(os.path.join(weather_path, '**', '*.parquet'), recursive=True))
+    return sorted(glob.glob(weather_path)) or [weather_path]
+
+
+# Fenêtres de course : (raceId, circuitId, coordonnées du circuit, début / fin en secondes UTC)
+def race_windows(data_root='.', window_hours=DEFAULT_WINDOW_HOURS):
+    data_dir = os.path.join(data_root, 'data')
+    window = int(window_hours * 3600)
+    start = race_start_expr(time_col='time').dt.epoch('s')
+    return (
+        scan_table('races', data_root, data_dir)
+        .join(scan_table('circuits', data_root, data_dir).select('circuitId', 'lat', 'lng'), on='circuitId')
+        .select(
+            'raceId', 'circuitId', 'lat', 'lng',
+            (start - window).alias('window_start'),
+            (start + window).alias('window_end'),
+        )
+        .collect()
+    )
+
+
+# Fusionner les intervalles [début, fin] qui se chevauchent
+def _merge_intervals(intervals):
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+# Cellules de la grille autour de chaque circuit : (cell_id, circuitId, latitude, longitude du circuit)
+def circuit_cells(windows, radius_km):
+    rows = []
+    for circuit_id, lat, lng in windows.select('circuitId', 'lat', 'lng').unique().iter_rows():
+        for lo, hi in cell_ranges(lat, lng, radius_km):
+            rows.extend((cell, circuit_id, lat, lng) for cell in range(lo, hi + 1))
+    return pl.DataFrame(rows, schema={'cell_id': pl.Int32, 'circuitId': pl.Int32,
+                                      'circuit_lat': pl.Float64, 'circuit_lng': pl.Float64}, orient='row')
+
+
+# Jours (UTC) couverts par chaque fenêtre : clé d'équi-jointure entre observations et courses
+def window_days(windows):
+    return windows.select(
+        'raceId', 'circuitId', 'window_start', 'window_end',
+        pl.int_ranges(pl.col('window_start') // SECONDS_PER_DAY, pl.col('window_end') // SECONDS_PER_DAY + 1)
+        .alias('day'),
+    ).explode('day')
+
+
+# Rectangle (latitude, longitude) englobant le cercle autour d'un circuit
+def _circuit_bbox(lat, lng, radius_km):
+    dlat = radius_km / KM_PER_DEG
+    cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+    dlng = radius_km / (KM_PER_DEG * cos_lat)
+    if dlng >= 180 or lng - dlng < -180 or lng + dlng > 180:
+        return lat - dlat, lat + dlat, -180.0, 180.0
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _column_range(row_group, name):
+    for i in range(row_group.num_columns):
+        column = row_group.column(i)
+        if column.path_in_schema == name:
+            stats = column.statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            return stats.min, stats.max
+    return None
+
+
+# Intervalles de temps (fusionnés) et rectangles (latitude, longitude) des fenêtres de course
+def window_ranges(windows, radius_km=DEFAULT_RADIUS_KM):
+    intervals = _merge_intervals(windows.select('window_start', 'window_end').iter_rows())
+    bboxes = [_circuit_bbox(lat, lng, radius_km) for lat, lng in windows.select('lat', 'lng').unique().iter_rows()]
+    return intervals, bboxes
+
+
+# Un intervalle (triés, disjoints) recoupe-t-il [lo, hi] ?
+def _overlaps(intervals, starts, lo, hi):
+    i = bisect.bisect_right(starts, hi) - 1
+    return i >= 0 and intervals[i][1] >= lo
+
+
+# Row groups d'un fichier à lire : ceux qu'au moins une fenêtre (temps) et un circuit (position)
+# peuvent concerner d'après leurs statistiques min / max (sans statistiques : lu)
+def select_row_groups(metadata, intervals, bboxes):
+    starts = [lo for lo, _ in intervals]
+    selected = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        time_range = _column_range(row_group, TIME_COLUMN)
+        lat_range = _column_range(row_group, LAT_COLUMN)
+        lng_range = _column_range(row_group, LNG_COLUMN)
+        in_time = time_range is None or _overlaps(intervals, starts, *time_range)
+        in_space = lat_range is None or lng_range is None or any(
+            lat_lo <= lat_range[1] and lat_range[0] <= lat_hi and lng_lo <= lng_range[1] and lng_range[0] <= lng_hi
+            for lat_lo, lat_hi, lng_lo, lng_hi in bboxes
+        )
+        if in_time and in_space:
+            selected.append(i)
+    return selected
+
+
+# Lire uniquement les row groups retenus, par lots, en comptant ce qui est réellement lu
+# (report : row groups lus / ignorés, lignes lues / totales)
+def read_selected_row_groups(files, intervals, bboxes, columns, report):
+    for path in files:
+        parquet_file = pq.ParquetFile(path)
+        metadata = parquet_file.metadata
+        selected = select_row_groups(metadata, intervals, bboxes)
+        report['files'] += 1
+        report['row_groups'] += metadata.num_row_groups
+        report['row_groups_skipped'] += metadata.num_row_groups - len(selected)
+        report['rows_total'] += metadata.num_rows
+        if not selected:
+            continue
+        for batch in parquet_file.iter_batches(batch_size=BATCH_ROWS, row_groups=selected, columns=columns):
+            report['rows_scanned'] += batch.num_rows
+            yield pl.from_arrow(batch)
+
+
+# Agrégats partiels d'un lot d'observations : association observation → circuit par cellule
+# de grille puis distance, observation → course par jour puis fenêtre exacte, puis nombre,
+# somme, min et max par (circuit, course), combinés ensuite par combine_partials
+def batch_partials(df_batch, cells, days, radius_km=DEFAULT_RADIUS_KM):
+    day = pl.col(TIME_COLUMN) // SECONDS_PER_DAY
+    return (
+        df_batch.lazy()
+        .filter(day.is_in(days['day'].unique().implode())
+                & pl.col(LAT_COLUMN).is_not_null() & pl.col(LNG_COLUMN).is_not_null())
+        .with_columns(cell_id_expr(), day.alias('day'))
+        .join(cells.lazy(), on='cell_id', how='inner')
+        .with_columns(haversine_km_columns(LAT_COLUMN, LNG_COLUMN, 'circuit_lat', 'circuit_lng').alias('distance_km'))
+        .filter(pl.col('distance_km') <= radius_km)
+        .join(days.lazy(), on=['circuitId', 'day'], how='inner')
+        .filter(pl.col(TIME_COLUMN).is_between(pl.col('window_start'), pl.col('window_end')))
+        .group_by('circuitId', 'raceId')
+        .agg(
+            pl.len().alias('n_obs'),
+            *[pl.col(column).sum().alias(f'{column}_sum') for column in WEATHER_COLUMNS],
+            *[pl.col(column).count().alias(f'{column}_count') for column in WEATHER_COLUMNS],
+            *[pl.col(column).min().alias(f'{column}_min') for column in WEATHER_COLUMNS],
+            *[pl.col(column).max().alias(f'{column}_max') for column in WEATHER_COLUMNS],
+        )
+        .collect()
+    )
+
+
+# Agrégats finaux par (circuit, course) : moyenne, min et max de chaque colonne météo
+def combine_partials(partials):
+    return (
+        pl.concat(partials)
+        .group_by('circuitId', 'raceId')
+        .agg(
+            pl.col('n_obs').sum(),
+            *[pl.col(f'{column}_sum').sum().alias(f'{column}_sum') for column in WEATHER_COLUMNS],
+            *[pl.col(f'{column}_count').sum().alias(f'{column}_count') for column in WEATHER_COLUMNS],
+            *[pl.col(f'{column}_min').min() for column in WEATHER_COLUMNS],
+            *[pl.col(f'{column}_max').max() for column in WEATHER_COLUMNS],
+        )
+        .select(
+            'circuitId', 'raceId', 'n_obs',
+            *[pl.when(pl.col(f'{column}_count') > 0).then(pl.col(f'{column}_sum') / pl.col(f'{column}_count'))
+              .alias(f'{column}_mean') for column in WEATHER_COLUMNS],
+            *[f'{column}_min' for column in WEATHER_COLUMNS],
+            *[f'{column}_max' for column in WEATHER_COLUMNS],
+        )
+    )
+
+
+# Agrégats météo de toutes les fenêtres de course en un seul passage sur l'archive : seuls les
+# row groups retenus par leurs statistiques sont lus, par lots (mémoire bornée)
+def race_window_weather(files, windows, radius_km=DEFAULT_RADIUS_KM, report=None):
+    report = report if report is not None else {}
+    for key in ('files', 'row_groups', 'row_groups_skipped', 'rows_total', 'rows_scanned'):
+        report.setdefault(key, 0)
+    intervals, bboxes = window_ranges(windows, radius_km)
+    cells = circuit_cells(windows, radius_km)
+    days = window_days(windows)
+    columns = [TIME_COLUMN, LAT_COLUMN, LNG_COLUMN, *WEATHER_COLUMNS]
+
+    partials = [batch_partials(df_batch, cells, days, radius_km)
+                for df_batch in read_selected_row_groups(files, intervals, bboxes, columns, report)]
+    if not partials:
+        # Aucun row group à lire : tableau vide, mêmes colonnes
+        empty = pl.DataFrame(schema={TIME_COLUMN: pl.Int64, **{column: pl.Float64 for column in columns[1:]}})
+        partials = [batch_partials(empty, cells, days, radius_km)]
+    return combine_partials(partials).sort('circuitId', 'raceId')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Agrégats météo par circuit et par fenêtre de course pour tous les circuits, calculés par lots
+# (mémoire bornée) sur une archive qui ne tient pas en mémoire
+def aggregate_race_windows(weather_path, data_root='.', output_path=DEFAULT_OUTPUT_PATH,
+                           radius_km=DEFAULT_RADIUS_KM, window_hours=DEFAULT_WINDOW_HOURS):
+    start = time.perf_counter()
+    files = archive_files(weather_path)
+    with span('weather_stream.windows'):
+        windows = race_windows(data_root, window_hours)
+
+    report = {}
+    tmp_path = output_path + '.tmp'
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with span('weather_stream.aggregate', files=len(files)) as s:
+        df = race_window_weather(files, windows, radius_km, report)
+        s.set(rows_scanned=report['rows_scanned'], row_groups_skipped=report['row_groups_skipped'])
+    df.write_parquet(tmp_path)
+    os.replace(tmp_path, output_path)
+
+    report.update({
+        'races': windows.height,
+        'races_with_weather': df.height,
+        'elapsed_s': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Agréger en streaming la météo de chaque course sur toute l\'archive')
+    parser.add_argument('--weather', default='weather_sample.parquet',
+                        help='Archive météo : fichier Parquet, dossier ou motif glob')
+    parser.add_argument('--data-root', default='.', help='Dossier des CSV Ergast (et du magasin Arrow data/)')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_PATH, help='Fichier Parquet de sortie')
+    parser.add_argument('--radius-km', type=float, default=DEFAULT_RADIUS_KM, help='Rayon autour de chaque circuit (km)')
+    parser.add_argument('--window-hours', type=float, default=DEFAULT_WINDOW_HOURS,
+                        help='Demi-largeur de la fenêtre autour du départ de la course (heures)')
+    args = parser.parse_args()
+
+    report = aggregate_race_windows(args.weather, args.data_root, args.output, args.radius_km, args.window_hours)
+    print(f"{report['races_with_weather']}/{report['races']} courses avec météo -> {args.output}")
+    print(f"{report['rows_scanned']}/{report['rows_total']} lignes lues, "
+          f"{report['row_groups_skipped']}/{report['row_groups']} row groups ignorés "
+          f"({report['files']} fichier(s))")
+    if report['peak_rss_mb'] is not None:
+        print(f"Pic mémoire (RSS) : {report['peak_rss_mb']:.0f} Mo")
+    print(f"Durée : {report['elapsed_s']:.2f}s")